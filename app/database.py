@@ -1,13 +1,35 @@
 import sqlite3
 import os
+import base64
 import json
 import re
+import functools
+import contextlib
 import logging
 import threading
-from queue import Queue, Empty, Full
+import time
+import atexit
+import queue
+import urllib.parse
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional
 # Removed heavy scikit-learn/numpy imports for SBC stability
 
+# orjson parses cached metadata several times faster; it is optional because
+# wheels are not available for every SBC architecture
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
 # Detect if running on Raspberry Pi for resource-constrained optimization
 def is_raspberry_pi():
     try:
@@ -19,6 +41,10 @@ def is_raspberry_pi():
 
 IS_RPI = is_raspberry_pi()
 
+# Backslash-escapes for the characters LIKE treats specially, applied in a
+# single translate() pass
+_LIKE_ESCAPES = str.maketrans({"\\": "\\\\", "%": "\\%", "_": "\\_"})
+
 def sanitize_like_pattern(pattern: str) -> str:
     """
     Sanitize user input for SQL LIKE queries to prevent SQL injection.
@@ -26,76 +52,449 @@ def sanitize_like_pattern(pattern: str) -> str:
     """
     if not pattern:
         return ""
-    # Escape special characters used in LIKE patterns
-    pattern = str(pattern).replace("\\", "\\\\")
-    pattern = pattern.replace("%", "\\%")
-    pattern = pattern.replace("_", "\\_")
-    return pattern
+    return str(pattern).translate(_LIKE_ESCAPES)
 
 DB_PATH = "data/nomad.db"
 
-# Connection Pool - reduced size for Raspberry Pi
-_connection_pool = Queue(maxsize=5 if IS_RPI else 10)
-_pool_lock = threading.Lock()
-
+# Connections: one read-write connection shared by every writer and a small
+# pool of read-only connections. In WAL mode the readers keep serving library
+# listings while a scan or upload is writing, instead of queueing behind it.
+# Each reader keeps its own page cache, so a Pi gets two; elsewhere one per
+# core (2-8). DB_READER_POOL_SIZE overrides either.
+def _default_reader_pool_size() -> int:
+    if IS_RPI:
+        return 2
+    return max(2, min(8, os.cpu_count() or 2))
+
+READER_POOL_SIZE = max(1, int(os.environ.get("DB_READER_POOL_SIZE", 0) or _default_reader_pool_size()))
+
+_writer = None
+# Reentrant so a write helper can call another one while holding the writer
+_writer_lock = threading.RLock()
+_reader_pool = queue.LifoQueue()
+_readers_opened = 0
+# Every connection not yet closed by close_all_connections(). Membership is
+# how a returned reader is known to be alive: sqlite3 connections are
+# in-process and do not drop on their own, so they are never probed with SQL.
+_open_connections = set()
+# Readers opened past READER_POOL_SIZE because the pool was empty; closed on
+# return instead of pooled
+_overflow_readers = set()
+_connections_lock = threading.Lock()
+# The reader a thread has checked out, and how many nested helpers use it
+_local = threading.local()
+# Bumped each time the writer is released by its outermost user, i.e. after
+# every write helper (or bulk() block) has committed or rolled back. A cached
+# query result taken at an older generation may predate a write.
+_write_generation = 0
+
+_NAT_SPLIT = re.compile(r'([0-9]+)').split
+
+# Natural-order key tuples: the reference order natural_sort_key_text must
+# agree with. Nothing on a request path uses them, so they are not memoized.
 def natural_sort_key_list(s):
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'([0-9]+)', str(s or ''))]
+    return tuple(int(t) if t.isdigit() else t.lower() for t in _NAT_SPLIT(s if isinstance(s, str) else str(s or '')))
 
-def natural_compare(a, b):
-    ka = natural_sort_key_list(a)
-    kb = natural_sort_key_list(b)
-    if ka < kb: return -1
-    if ka > kb: return 1
-    return 0
+_NAT_DIGITS = re.compile(r'[0-9]+')
 
-def get_db():
-    """Get a database connection from the pool"""
-    try:
-        conn = _connection_pool.get_nowait()
-        # Verify connection is still valid
-        try:
-            conn.execute("SELECT 1")
-            return conn
-        except (sqlite3.ProgrammingError, sqlite3.OperationalError):
-            # Connection closed or invalid, create new one below
-            pass
-    except Empty:
-        # Pool empty, create new connection below
-        pass
+@functools.lru_cache(maxsize=8192 if IS_RPI else 65536)
+def natural_sort_key_text(s) -> str:
+    """Natural-order key as plain text: lower-cased, digit runs zero-padded.
+
+    Stored in library_index.name_sort/folder_sort so ORDER BY and indexes can
+    use SQLite's built-in BINARY comparison instead of a Python collation callback.
+    Python sorts use it too: comparing two str keys is a single C comparison,
+    where key tuples compare element by element, and the order then matches
+    the library pages SQLite returns. Memoized, as folder names repeat.
+    """
+    return _NAT_DIGITS.sub(lambda m: m.group().zfill(12), (s if isinstance(s, str) else str(s or '')).lower())
 
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    logging.getLogger(__name__).debug(f"Connecting to database at {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+def library_show_name(name, folder):
+    """Show a library_index row of the shows category is grouped under.
+
+    The first folder component ('Show/Season 1' -> 'Show'); for files directly
+    in /data/shows, the file name up to its first dot.
+    """
+    if folder is None:
+        return None
+    if '/' in folder:
+        return folder.split('/', 1)[0]
+    if folder != '.':
+        return folder
+    return (name or '').split('.', 1)[0]
+
+def _connect(readonly: bool = False):
+    if DB_PATH != ":memory:":
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    logging.getLogger(__name__).debug(f"Connecting to database at {DB_PATH} ({'ro' if readonly else 'rw'})")
+    # A larger statement cache keeps the hot queries below prepared for the
+    # lifetime of the (long-lived) connection. isolation_level=None leaves
+    # SQLite in autocommit: a single-statement write commits by itself, and
+    # helpers that write more than once open their transaction with _begin().
+    if readonly:
+        uri = f"file:{urllib.parse.quote(os.path.abspath(DB_PATH))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256, isolation_level=None)
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256, isolation_level=None)
     conn.row_factory = sqlite3.Row
-    conn.create_collation("NATSORT", natural_compare)
-    # Enable performance settings
-    conn.execute("PRAGMA journal_mode=WAL")
+    _configure_connection(conn, readonly)
+    with _connections_lock:
+        _open_connections.add(conn)
+    return conn
+
+def _configure_connection(conn, readonly: bool = False):
+    """Apply performance PRAGMAs to a freshly opened connection"""
+    # journal_mode is stored in the database file; the writer is always
+    # opened first, so switching it on there covers the readers too. An
+    # in-memory database cannot use WAL.
+    if not readonly and DB_PATH != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+    if not readonly:
+        # Bound the rows ANALYZE samples per index when PRAGMA optimize decides
+        # a table's statistics are stale, so a refresh stays cheap on a Pi
+        conn.execute("PRAGMA analysis_limit=400")
+        # A scan checkpoints less often (SCAN_WAL_AUTOCHECKPOINT), so the WAL
+        # file grows to tens of MB; SQLite reuses it but never shrinks it.
+        # Truncate it back down when it is reset, to give the SD card the
+        # space back and keep later checkpoints writing to a small file.
+        conn.execute("PRAGMA journal_size_limit=16777216")
+    # The rest are per-connection settings
     conn.execute("PRAGMA synchronous=NORMAL")
     # Reduced cache size for Raspberry Pi: 16MB for Pi, 64MB for others
     cache_size = -16000 if IS_RPI else -64000
     conn.execute(f"PRAGMA cache_size={cache_size}")
     conn.execute("PRAGMA temp_store=MEMORY")
+    # Memory-mapped reads skip the pager copy; keep the window small on a Pi
+    mmap_size = 67108864 if IS_RPI else 268435456
+    conn.execute(f"PRAGMA mmap_size={mmap_size}")
+    # Wait for a concurrent writer instead of failing with "database is locked"
+    conn.execute("PRAGMA busy_timeout=5000")
+
+def get_write_db():
+    """Get the read-write connection, holding it until return_db().
+
+    Every helper that modifies the database goes through here, so writes are
+    serialized in Python rather than contending for SQLite's write lock.
+    """
+    global _writer
+    _writer_lock.acquire()
+    try:
+        if _writer is None:
+            _writer = _connect()
+    except Exception:
+        _writer_lock.release()
+        raise
+    _local.write_depth = getattr(_local, "write_depth", 0) + 1
+    return _writer
+
+def get_db():
+    """Check out a read-only connection for queries, until return_db()."""
+    global _readers_opened
+    conn = getattr(_local, "reader", None)
+    if conn is not None:
+        _local.read_depth += 1
+        return conn
+    if DB_PATH == ":memory:":
+        # Each connection would get its own private in-memory database
+        return get_write_db()
+    if _writer is None:
+        # Open the writer first: it creates the file and enables WAL
+        return_db(get_write_db())
+
+    try:
+        conn = _reader_pool.get_nowait()
+    except queue.Empty:
+        with _connections_lock:
+            can_open = _readers_opened < READER_POOL_SIZE
+            if can_open:
+                _readers_opened += 1
+        if can_open:
+            try:
+                conn = _connect(readonly=True)
+            except Exception:
+                with _connections_lock:
+                    _readers_opened -= 1
+                raise
+        else:
+            # Every reader is checked out. Waiting for one would stall the
+            # event loop where get_db() is called from it (protect_data, the
+            # async endpoints), so open a short-lived extra one instead.
+            conn = _connect(readonly=True)
+            with _connections_lock:
+                _overflow_readers.add(conn)
+    _local.reader = conn
+    _local.read_depth = 1
     return conn
 
+def warm_reader_pool():
+    """Open the reader connections up front instead of on first use.
+
+    Readers are otherwise opened lazily, one per concurrent request. The
+    first requests after startup include the protect_data middleware, which
+    runs on the event loop, so they would pay for the file open and PRAGMAs
+    there. Call once init_db() has run.
+    """
+    global _readers_opened
+    if DB_PATH == ":memory:":
+        return
+    if _writer is None:
+        return_db(get_write_db())
+    while True:
+        with _connections_lock:
+            if _readers_opened >= READER_POOL_SIZE:
+                return
+            _readers_opened += 1
+        try:
+            conn = _connect(readonly=True)
+        except Exception:
+            with _connections_lock:
+                _readers_opened -= 1
+            raise
+        _reader_pool.put(conn)
+
 def return_db(conn):
-    """Return connection to pool"""
+    """Release a connection obtained from get_db() or get_write_db().
+
+    Connections stay open; this discards a transaction a failed helper may
+    have left open and hands the connection to the next caller.
+    """
+    global _write_generation
     if conn is None:
         return
-    try:
-        _connection_pool.put_nowait(conn)
-    except Full:
-        # Pool full, close connection
+    if conn is _writer:
+        _local.write_depth -= 1
+        try:
+            if _local.write_depth == 0 and conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            pass
+        finally:
+            if _local.write_depth == 0:
+                _write_generation += 1
+            _writer_lock.release()
+        return
+    _local.read_depth -= 1
+    if _local.read_depth > 0:
+        return
+    _local.reader = None
+    with _connections_lock:
+        overflow = conn in _overflow_readers
+        if overflow:
+            _overflow_readers.discard(conn)
+            _open_connections.discard(conn)
+    if overflow:
         try:
             conn.close()
         except Exception:
-            # Ignore errors when closing connection
             pass
+        return
+    if conn not in _open_connections:
+        # Closed by close_all_connections() while checked out
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        pass
+    _reader_pool.put(conn)
+
+def _in_bulk() -> bool:
+    return getattr(_local, "bulk", False)
+
+def _begin(conn, immediate: bool = False):
+    """Open a write transaction, unless bulk() already has one open.
+
+    Connections are in autocommit mode, so any helper issuing more than one
+    write statement must call this first for them to commit together.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+def _commit(conn):
+    """Commit a write helper's work; inside bulk() the block commits once instead."""
+    if not _in_bulk():
+        conn.commit()
+
+def _rollback(conn):
+    if not _in_bulk():
+        conn.rollback()
+
+@contextlib.contextmanager
+def bulk():
+    """Run several write helpers as one transaction with a single commit.
+
+        with database.bulk():
+            database.upsert_library_index_items(batch)
+            database.set_library_index_state(category, count)
+
+    The writer stays checked out for the whole block, so keep it short:
+    gather data first, then write. Nested blocks join the outer one.
+    """
+    conn = get_write_db()
+    outer = not _in_bulk()
+    if outer:
+        _begin(conn)
+        _local.bulk = True
+    try:
+        yield conn
+        if outer:
+            conn.commit()
+            # A set_setting() or set_library_index_state() inside the block
+            # invalidated its key before the commit; drop anything a reader
+            # may have cached in between
+            _clear_settings_cache()
+            _clear_index_state_cache()
+            _clear_session_cache()
+    except BaseException:
+        if outer:
+            conn.rollback()
+        raise
+    finally:
+        if outer:
+            _local.bulk = False
+        return_db(conn)
+
+# WAL pages between automatic checkpoints: SQLite's default, and the larger
+# interval used while a library scan is writing
+WAL_AUTOCHECKPOINT = 1000
+SCAN_WAL_AUTOCHECKPOINT = 10000
+_scan_mode_depth = 0
+_scan_mode_lock = threading.Lock()
+
+def _set_wal_autocheckpoint(pages: int, checkpoint: bool = False):
+    conn = get_write_db()
+    try:
+        conn.execute(f"PRAGMA wal_autocheckpoint={int(pages)}").fetchone()
+        if checkpoint:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    finally:
+        return_db(conn)
+
+def optimize_db():
+    """Let SQLite refresh planner statistics for tables that changed a lot.
+
+    PRAGMA optimize only re-analyzes tables this connection has used whose
+    statistics look stale, so it is cheap to call after every scan.
+    """
+    conn = get_write_db()
+    try:
+        if not conn.in_transaction:
+            conn.executescript("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"PRAGMA optimize failed: {e}")
+    finally:
+        return_db(conn)
+
+@contextlib.contextmanager
+def scan_mode():
+    """Defer WAL checkpoints while a library scan writes batch after batch.
+
+    With WAL and synchronous=NORMAL a commit does not fsync; the syncs happen
+    when the WAL is checkpointed back into the database. During a scan the
+    checkpoint interval is raised, and one checkpoint runs when the last
+    concurrent scan finishes. Durability of each commit is unchanged.
+    """
+    global _scan_mode_depth
+    with _scan_mode_lock:
+        _scan_mode_depth += 1
+        if _scan_mode_depth == 1:
+            _set_wal_autocheckpoint(SCAN_WAL_AUTOCHECKPOINT)
+    try:
+        yield
+    finally:
+        with _scan_mode_lock:
+            _scan_mode_depth -= 1
+            if _scan_mode_depth == 0:
+                _set_wal_autocheckpoint(WAL_AUTOCHECKPOINT, checkpoint=True)
+                # A first scan takes library_index from empty to thousands of
+                # rows; update the statistics the planner picks indexes with
+                optimize_db()
+
+@atexit.register
+def close_all_connections():
+    """Close every open connection; the next get_db()/get_write_db() reopens.
+
+    Runs at interpreter shutdown, and before a backup restore swaps the
+    database file out from under the pool. Closing the last connection
+    checkpoints the WAL back into the file.
+    """
+    global _writer, _readers_opened
+    # A daemon thread may still hold the writer at shutdown; don't hang on it
+    locked = _writer_lock.acquire(timeout=5)
+    try:
+        if locked:
+            try:
+                flush_progress()
+            except sqlite3.Error as e:
+                logging.getLogger(__name__).warning(f"Could not save buffered progress: {e}")
+        if locked and _writer is not None:
+            # SQLite's advice: optimize just before closing a connection
+            optimize_db()
+        with _connections_lock:
+            conns = list(_open_connections)
+            _open_connections.clear()
+            _overflow_readers.clear()
+            _writer = None
+            _readers_opened = 0
+        while True:
+            try:
+                _reader_pool.get_nowait()
+            except queue.Empty:
+                break
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                # Ignore errors when closing connection
+                pass
+        _clear_settings_cache()
+        _clear_index_state_cache()
+        _clear_session_cache()
+    finally:
+        if locked:
+            _writer_lock.release()
+
+@contextlib.contextmanager
+def connections_closed():
+    """Close every connection and keep them closed until the block exits.
+
+        with database.connections_closed():
+            shutil.copy2(new_db, DB_PATH)
+
+    The writer lock is held throughout. Nothing can reopen the database file
+    in between, neither a write helper nor a reader (get_db() opens the
+    writer first when it is closed), nor the progress flush job.
+    """
+    with _writer_lock:
+        close_all_connections()
+        yield
+
+# Stored in PRAGMA user_version once init_db has brought a database up to
+# date. Bump it with every change to the tables, indexes, migrations or
+# backfills below, or existing databases will not pick the change up.
+SCHEMA_VERSION = 4
 
 def init_db():
+    global _fts_enabled
     logging.getLogger(__name__).debug("Starting database initialization...")
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
+        if c.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            # Nothing to create, migrate or backfill; the dozens of CREATE ...
+            # IF NOT EXISTS and failing ALTERs below are skipped on every boot
+            logging.getLogger(__name__).debug("Database schema is current")
+            try:
+                c.execute("SELECT 1 FROM library_fts LIMIT 0")
+                _fts_enabled = True
+            except sqlite3.OperationalError:
+                # Never created, or this SQLite build lacks FTS5
+                _fts_enabled = False
+            return
+
+        vacuumed = _enable_incremental_vacuum(c)
+        # Schema, migrations and backfills commit together at the end
+        _begin(conn)
         logging.getLogger(__name__).debug("Creating tables...")
         c.execute('''
             CREATE TABLE IF NOT EXISTS progress (
@@ -106,7 +505,7 @@ def init_db():
                 play_count INTEGER DEFAULT 0,
                 last_played TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (user_id, path)
-            )
+            ) WITHOUT ROWID
         ''')
         c.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -165,7 +564,7 @@ def init_db():
                 category TEXT PRIMARY KEY,
                 scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 item_count INTEGER DEFAULT 0
-            )
+            ) WITHOUT ROWID
         ''')
         c.execute('''
             CREATE TABLE IF NOT EXISTS sessions (
@@ -173,14 +572,14 @@ def init_db():
                 user_id INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id)
-            )
+            ) WITHOUT ROWID
         ''')
         c.execute('''
             CREATE TABLE IF NOT EXISTS settings (
                 key TEXT PRIMARY KEY,
                 value TEXT,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            ) WITHOUT ROWID
         ''')
         c.execute('''
             CREATE TABLE IF NOT EXISTS omdb_cache (
@@ -216,6 +615,48 @@ def init_db():
             c.execute("ALTER TABLE library_index ADD COLUMN year TEXT")
         except sqlite3.OperationalError: pass
 
+        # Lower-cased copies of name/folder so search doesn't LOWER() every row
+        for col in ("name_lc", "folder_lc"):
+            try:
+                c.execute(f"ALTER TABLE library_index ADD COLUMN {col} TEXT")
+            except sqlite3.OperationalError: pass
+        c.execute("SELECT path, name, folder FROM library_index WHERE name_lc IS NULL")
+        missing = c.fetchall()
+        if missing:
+            # Backfill in Python: SQLite's LOWER() only folds ASCII
+            c.executemany(
+                "UPDATE library_index SET name_lc = ?, folder_lc = ? WHERE path = ?",
+                [((r["name"] or "").lower(), (r["folder"] or "").lower(), r["path"]) for r in missing],
+            )
+
+        # Natural-order sort keys (see natural_sort_key_text)
+        for col in ("name_sort", "folder_sort"):
+            try:
+                c.execute(f"ALTER TABLE library_index ADD COLUMN {col} TEXT")
+            except sqlite3.OperationalError: pass
+        c.execute("SELECT path, name, folder FROM library_index WHERE name_sort IS NULL")
+        missing = c.fetchall()
+        if missing:
+            c.executemany(
+                "UPDATE library_index SET name_sort = ?, folder_sort = ? WHERE path = ?",
+                [(natural_sort_key_text(r["name"]), natural_sort_key_text(r["folder"]), r["path"]) for r in missing],
+            )
+
+        # Show a shows row groups under (see library_show_name) and its
+        # natural-order key; NULL for the other categories
+        for col in ("show_name", "show_sort"):
+            try:
+                c.execute(f"ALTER TABLE library_index ADD COLUMN {col} TEXT")
+            except sqlite3.OperationalError: pass
+        c.execute("SELECT path, name, folder FROM library_index WHERE category = 'shows' AND (show_name IS NULL OR show_sort IS NULL)")
+        missing = c.fetchall()
+        if missing:
+            shows = [(library_show_name(r["name"], r["folder"]), r["path"]) for r in missing]
+            c.executemany(
+                "UPDATE library_index SET show_name = ?, show_sort = ? WHERE path = ?",
+                [(show, natural_sort_key_text(show) if show is not None else None, path) for show, path in shows],
+            )
+
         try:
             c.execute("ALTER TABLE sessions ADD COLUMN user_id INTEGER")
         except sqlite3.OperationalError: pass
@@ -229,12 +670,15 @@ def init_db():
         except sqlite3.OperationalError: pass
 
         # Add indexes for performance
-        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category ON library_index(category)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_library_path ON library_index(path)")
+        # library_index(category) is a prefix of the composite indexes below and
+        # library_index(path) duplicates the primary key; both only slowed writes
+        c.execute("DROP INDEX IF EXISTS idx_library_category")
+        c.execute("DROP INDEX IF EXISTS idx_library_path")
         c.execute("CREATE INDEX IF NOT EXISTS idx_library_folder ON library_index(folder)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_library_mtime ON library_index(mtime)")
+        # mtime is only ever sorted on within a category (idx_library_category_mtime)
+        c.execute("DROP INDEX IF EXISTS idx_library_mtime")
         c.execute("CREATE INDEX IF NOT EXISTS idx_progress_path ON progress(path)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_path ON file_metadata(path)")
+        c.execute("DROP INDEX IF EXISTS idx_metadata_path")  # duplicates the primary key
         c.execute("CREATE INDEX IF NOT EXISTS idx_omdb_expires ON omdb_cache(expires_at)")
 
         # Additional performance indexes
@@ -242,14 +686,24 @@ def init_db():
         c.execute("CREATE INDEX IF NOT EXISTS idx_progress_user_lastplayed ON progress(user_id, last_played DESC)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_progress_user_playcount ON progress(user_id, play_count DESC)")
 
-        # For metadata searches
-        c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_title ON file_metadata(title)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_imdb ON file_metadata(imdb_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_year ON file_metadata(year)")
+        # file_metadata is looked up by path (its primary key); the duplicate
+        # scan is the only query on imdb_id, so that index is partial on the
+        # same condition and leaves out the many rows without an ID. Nothing
+        # filters on title or year, and each index cost every metadata save.
+        c.execute("DROP INDEX IF EXISTS idx_metadata_title")
+        c.execute("DROP INDEX IF EXISTS idx_metadata_year")
+        c.execute("DROP INDEX IF EXISTS idx_metadata_imdb")
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_metadata_imdb_known ON file_metadata(imdb_id)
+            WHERE imdb_id IS NOT NULL AND imdb_id != 'N/A' AND imdb_id != ''
+        """)
 
-        # For library filtering and sorting
-        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_year ON library_index(category, year)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_library_genre ON library_index(genre)")
+        # For library filtering and sorting: a year filter comes back already
+        # in name order, and the year sorts only re-sort within each year
+        c.execute("DROP INDEX IF EXISTS idx_library_category_year")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_year_sort ON library_index(category, year, name_sort)")
+        # Genre filters go through library_genres
+        c.execute("DROP INDEX IF EXISTS idx_library_genre")
 
         # Migrations
         try:
@@ -266,6 +720,7 @@ def init_db():
         except sqlite3.OperationalError: pass
 
         c.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_user ON watchlist(user_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_path ON watchlist(path)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_library_name ON library_index(name)")
 
         # For session lookups
@@ -296,6 +751,8 @@ def init_db():
         ''')
         c.execute("CREATE INDEX IF NOT EXISTS idx_playlist_user ON playlists(user_id)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_playlist_items_pl ON playlist_items(playlist_id, position)")
+        # rename_media_path moves watchlist and playlist entries by path range
+        c.execute("CREATE INDEX IF NOT EXISTS idx_playlist_items_path ON playlist_items(path)")
 
         # Ratings & Reviews
         c.execute('''
@@ -312,52 +769,298 @@ def init_db():
         c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_path ON ratings(path)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_user ON ratings(user_id)")
 
+        # Library listing filters on category and looks episodes up by
+        # (category, folder); one composite index serves both plus the name order
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_folder_name ON library_index(category, folder, name)")
+        # Covers the name/folder search so LIKE is evaluated on index pages only
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_lc ON library_index(category, name_lc, folder_lc)")
+        # Name-sorted pages walk this index; the path tiebreaker makes the order
+        # total so keyset pages can resume from it
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_sort ON library_index(category, name_sort, path)")
+        # newest/oldest pages
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_mtime ON library_index(category, mtime DESC)")
+        c.execute("DROP INDEX IF EXISTS idx_library_category_genre")
+        # query_shows groups episodes by show, and walks shows in name order
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_show ON library_index(category, show_name)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_library_category_show_sort ON library_index(category, show_sort, show_name)")
+
+        # Tables only ever reached through their text primary key are stored
+        # clustered on it; databases created before that are rebuilt once
+        for table, key in _WITHOUT_ROWID_TABLES.items():
+            _convert_without_rowid(c, table, key)
+
+        _fts_enabled = _init_library_fts(c, rebuild=vacuumed)
+        _init_library_genres(c)
+
+        # Give the planner statistics for the composite indexes. Only tables
+        # with an index that has never been analyzed are scanned, so this runs
+        # once per new index rather than rescanning the library on every boot.
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if c.fetchone() is None:
+            c.execute("ANALYZE")
+        else:
+            c.execute('''
+                SELECT DISTINCT tbl_name FROM sqlite_master
+                WHERE type = 'index' AND tbl_name IN ('library_index', 'library_genres', 'progress', 'file_metadata')
+                  AND name NOT IN (SELECT idx FROM sqlite_stat1 WHERE idx IS NOT NULL)
+            ''')
+            for (table,) in c.fetchall():
+                c.execute(f"ANALYZE {table}")
+
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
     finally:
         return_db(conn)
 
+# Small tables keyed by text, and their primary key columns. A rowid table
+# keeps such a key in a separate index, so every lookup walks two B-trees.
+# library_index keeps its rowid for library_fts; file_metadata rows carry the
+# raw OMDb JSON, too large to store in a primary key B-tree.
+_WITHOUT_ROWID_TABLES = {
+    "progress": ("user_id", "path"),
+    "sessions": ("token",),
+    "settings": ("key",),
+    "library_index_state": ("category",),
+}
+
+def _convert_without_rowid(c, table: str, key) -> bool:
+    """Rebuild a rowid table as WITHOUT ROWID, keeping its rows and indexes."""
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = c.fetchone()
+    if row is None or re.search(r"WITHOUT\s+ROWID\s*$", row[0], re.IGNORECASE):
+        return False
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+    index_sql = [r[0] for r in c.fetchall()]
+    # The stored CREATE statement includes every column added by ALTER TABLE
+    create_sql = re.sub(r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[\"`]?\w+[\"`]?",
+                        f"CREATE TABLE {table}_new", row[0], count=1, flags=re.IGNORECASE)
+    c.execute(f"DROP TABLE IF EXISTS {table}_new")
+    c.execute(create_sql + " WITHOUT ROWID")
+    # Primary key columns are NOT NULL without a rowid; rows with a NULL key
+    # could never be looked up anyway
+    not_null = " AND ".join(f"{col} IS NOT NULL" for col in key)
+    c.execute(f"INSERT OR IGNORE INTO {table}_new SELECT * FROM {table} WHERE {not_null}")
+    c.execute(f"DROP TABLE {table}")
+    c.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in index_sql:
+        c.execute(sql)
+    logging.getLogger(__name__).info(f"Rebuilt {table} as a WITHOUT ROWID table")
+    return True
+
+def _enable_incremental_vacuum(c) -> bool:
+    """Switch the database to auto_vacuum=INCREMENTAL if it is not already.
+
+    The mode can only change before the first table is created or through a
+    full VACUUM, so an existing database is rebuilt once. Returns True in that
+    case: VACUUM may renumber library_index rowids, which library_fts uses.
+    """
+    c.execute("PRAGMA auto_vacuum")
+    if c.fetchone()[0] == 2:
+        return False
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    c.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+    if c.fetchone() is None:
+        # Fresh file: takes effect when the first table is created
+        return False
+    logging.getLogger(__name__).info("Rebuilding database once to enable incremental vacuum...")
+    c.execute("VACUUM")
+    return True
+
+# Set by init_db once the library_fts table and its triggers are in place
+_fts_enabled = False
+
+# library_index columns mirrored into library_fts
+_LIBRARY_FTS_COLUMNS = ("name", "folder", "show_name")
+
+def _init_library_fts(c, rebuild: bool = False) -> bool:
+    """Create the full-text index over library names/folders, if FTS5 exists.
+
+    library_fts is an external-content table: it stores only the token index
+    and reads its columns back from library_index by rowid. Triggers keep it
+    in step with every insert, update and delete on library_index. When the
+    indexed columns change, the table and its triggers are recreated.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'library_fts'")
+    exists = c.fetchone() is not None
+    if exists:
+        c.execute("PRAGMA table_info(library_fts)")
+        if tuple(r[1] for r in c.fetchall()) != _LIBRARY_FTS_COLUMNS:
+            for trigger in ("library_fts_ai", "library_fts_ad", "library_fts_au"):
+                c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            c.execute("DROP TABLE library_fts")
+            exists = False
+
+    cols = ", ".join(_LIBRARY_FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{col}" for col in _LIBRARY_FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{col}" for col in _LIBRARY_FTS_COLUMNS)
+    try:
+        c.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(
+                {cols},
+                content='library_index', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logging.getLogger(__name__).warning(f"FTS5 unavailable, library search will use LIKE: {e}")
+        return False
+
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_ai AFTER INSERT ON library_index BEGIN
+            INSERT INTO library_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_ad AFTER DELETE ON library_index BEGIN
+            INSERT INTO library_fts(library_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_au AFTER UPDATE OF {cols} ON library_index BEGIN
+            INSERT INTO library_fts(library_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            INSERT INTO library_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    if not exists or rebuild:
+        # Index whatever was already scanned before the table existed
+        c.execute("INSERT INTO library_fts(library_fts) VALUES ('rebuild')")
+    return True
+
+def split_genres(genre) -> List[str]:
+    """Individual genres of a comma separated genre string ("Action, Drama")."""
+    return [g for g in (part.strip() for part in (genre or '').split(',')) if g]
+
+def _init_library_genres(c):
+    """Create library_genres, one row per (file, genre) of library_index.
+
+    upsert_library_index_items() inserts the pairs; triggers drop them when a
+    row is deleted or its genre changes, and follow a row when it is renamed.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'library_genres'")
+    exists = c.fetchone() is not None
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS library_genres (
+            path TEXT NOT NULL,
+            category TEXT,
+            genre TEXT NOT NULL COLLATE NOCASE,
+            PRIMARY KEY (path, genre)
+        )
+    ''')
+    # Covers the genre list of a category and the genre filter
+    c.execute("CREATE INDEX IF NOT EXISTS idx_library_genres_category ON library_genres(category, genre, path)")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS library_genres_ad AFTER DELETE ON library_index BEGIN
+            DELETE FROM library_genres WHERE path = old.path;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS library_genres_au AFTER UPDATE OF genre, category ON library_index
+        WHEN old.genre IS NOT new.genre OR old.category IS NOT new.category BEGIN
+            DELETE FROM library_genres WHERE path = old.path;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS library_genres_ap AFTER UPDATE OF path ON library_index
+        WHEN old.path != new.path BEGIN
+            UPDATE OR REPLACE library_genres SET path = new.path WHERE path = old.path;
+        END
+    ''')
+    if not exists:
+        c.execute("SELECT path, category, genre FROM library_index WHERE genre IS NOT NULL AND genre != ''")
+        c.executemany(
+            "INSERT OR IGNORE INTO library_genres (path, category, genre) VALUES (?, ?, ?)",
+            [(r["path"], r["category"], g) for r in c.fetchall() for g in split_genres(r["genre"])],
+        )
+
+_FTS_TOKEN_RE = re.compile(r'\w+')
+
+def _fts_match_query(q: str, column: str = None) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match as a prefix.
+
+    Words are quoted, so FTS5 operators or punctuation in the input are never
+    interpreted. With ``column`` only that library_fts column is searched.
+    Returns None when there is nothing to search for.
+    """
+    tokens = _FTS_TOKEN_RE.findall(q or '')
+    if not tokens:
+        return None
+    match = ' '.join(f'"{t}"*' for t in tokens)
+    return f'{column} : ({match})' if column else match
+
+# Hot-path statements live at module level so every call hands sqlite3 the
+# same text and hits its per-connection prepared-statement cache.
+_SQL_SET_SETTING = '''
+    INSERT INTO settings (key, value, updated_at)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(key) DO UPDATE SET
+        value = excluded.value,
+        updated_at = CURRENT_TIMESTAMP
+'''
+_SQL_GET_SETTING = 'SELECT value FROM settings WHERE key = ?'
+
+# Settings are read on many requests and change rarely, so values (including
+# "not set") are cached in-process. set_setting is the only writer here; it
+# drops the key and bumps the generation so a read racing the write cannot
+# cache the old value. Entries also expire after CACHE_TTL_SECONDS, so a
+# change made outside this process (update.sh runs migrate_db.py against the
+# live database, or someone edits it with the sqlite3 shell) shows up anyway.
+CACHE_TTL_SECONDS = 30.0
+
+_settings_cache: Dict[str, tuple] = {}
+_settings_generation = 0
+_settings_lock = threading.Lock()
+
 def set_setting(key: str, value: str):
-    conn = get_db()
+    global _settings_generation
+    conn = get_write_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO settings (key, value, updated_at)
-            VALUES (?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(key) DO UPDATE SET
-                value = excluded.value,
-                updated_at = CURRENT_TIMESTAMP
-        ''', (key, value))
-        conn.commit()
+        conn.execute(_SQL_SET_SETTING, (key, value))
+        _commit(conn)
     finally:
         return_db(conn)
+        with _settings_lock:
+            _settings_cache.pop(key, None)
+            _settings_generation += 1
+
+def _clear_settings_cache():
+    global _settings_generation
+    with _settings_lock:
+        _settings_cache.clear()
+        _settings_generation += 1
 
 def get_setting(key: str) -> Optional[str]:
+    with _settings_lock:
+        cached = _settings_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        generation = _settings_generation
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('SELECT value FROM settings WHERE key = ?', (key,))
-        row = c.fetchone()
-        if row:
-            return row['value']
-        return None
+        row = conn.execute(_SQL_GET_SETTING, (key,)).fetchone()
+        value = row['value'] if row else None
     finally:
         return_db(conn)
+    with _settings_lock:
+        if generation == _settings_generation:
+            _settings_cache[key] = (time.monotonic() + CACHE_TTL_SECONDS, value)
+    return value
 
 def get_all_settings() -> List[dict]:
     conn = get_db()
     try:
         c = conn.cursor()
         c.execute('SELECT key, value FROM settings')
-        return [dict(row) for row in c.fetchall()]
+        return [dict(row) for row in c]
     finally:
         return_db(conn)
 
+_SQL_GET_USER_BY_USERNAME = 'SELECT * FROM users WHERE username = ?'
+_SQL_GET_USER_BY_ID = 'SELECT * FROM users WHERE id = ?'
+
 def get_user_by_username(username: str) -> Optional[dict]:
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE username = ?', (username.lower(),))
-        row = c.fetchone()
+        row = conn.execute(_SQL_GET_USER_BY_USERNAME, (username.lower(),)).fetchone()
         return dict(row) if row else None
     finally:
         return_db(conn)
@@ -365,32 +1068,38 @@ def get_user_by_username(username: str) -> Optional[dict]:
 def get_user_by_id(user_id: int) -> Optional[dict]:
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = c.fetchone()
+        row = conn.execute(_SQL_GET_USER_BY_ID, (user_id,)).fetchone()
         return dict(row) if row else None
     finally:
         return_db(conn)
 
 def create_user(username: str, password_hash: str, is_admin: bool = False, must_change_password: bool = False) -> int:
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('''
             INSERT INTO users (username, password_hash, is_admin, must_change_password)
             VALUES (?, ?, ?, ?)
         ''', (username.lower(), password_hash, 1 if is_admin else 0, 1 if must_change_password else 0))
-        conn.commit()
+        _commit(conn)
         return c.lastrowid
     finally:
         return_db(conn)
 
 def update_user_password(user_id: int, new_hash: str):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('UPDATE users SET password_hash = ?, must_change_password = 0 WHERE id = ?', (new_hash, user_id))
-        conn.commit()
+        _commit(conn)
+    finally:
+        return_db(conn)
+
+def has_users() -> bool:
+    """Whether any account exists, without loading the user list."""
+    conn = get_db()
+    try:
+        return conn.execute('SELECT EXISTS (SELECT 1 FROM users)').fetchone()[0] == 1
     finally:
         return_db(conn)
 
@@ -399,28 +1108,31 @@ def get_all_users() -> List[dict]:
     try:
         c = conn.cursor()
         c.execute('SELECT id, username, is_admin, created_at FROM users')
-        return [dict(row) for row in c.fetchall()]
+        return [dict(row) for row in c]
     finally:
         return_db(conn)
 
 def delete_user(user_id: int):
-    conn = get_db()
+    flush_progress()
+    conn = get_write_db()
     try:
+        _begin(conn)
         c = conn.cursor()
         c.execute('DELETE FROM users WHERE id = ?', (user_id,))
         c.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
         c.execute('DELETE FROM profiles WHERE user_id = ?', (user_id,))
         c.execute('DELETE FROM progress WHERE user_id = ?', (user_id,))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
+        _clear_session_cache()
 
 def update_user_role(user_id: int, is_admin: bool):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('UPDATE users SET is_admin = ? WHERE id = ?', (1 if is_admin else 0, user_id))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -434,8 +1146,8 @@ def get_profile(user_id: int) -> Optional[dict]:
             data = dict(row)
             if data.get('preferences'):
                 try:
-                    data['preferences'] = json.loads(data['preferences'])
-                except (json.JSONDecodeError, TypeError, ValueError):
+                    data['preferences'] = _json_loads(data['preferences'])
+                except (TypeError, ValueError):
                     data['preferences'] = {}
             return data
         return None
@@ -443,10 +1155,10 @@ def get_profile(user_id: int) -> Optional[dict]:
         return_db(conn)
 
 def upsert_profile(user_id: int, name: str, avatar: str = None, preferences: dict = None, parental_controls: int = 0):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
-        prefs_json = json.dumps(preferences or {})
+        prefs_json = _json_dumps(preferences or {})
         c.execute('''
             INSERT INTO profiles (user_id, name, avatar, preferences, parental_controls)
             VALUES (?, ?, ?, ?, ?)
@@ -456,86 +1168,340 @@ def upsert_profile(user_id: int, name: str, avatar: str = None, preferences: dic
                 preferences = excluded.preferences,
                 parental_controls = excluded.parental_controls
         ''', (user_id, name, avatar, prefs_json, parental_controls))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
+# "current_time" is quoted because a bare current_time in a result column is
+# SQLite's CURRENT_TIME keyword, not the progress column.
+# last_played is when the position was reported, not when it was flushed
+_SQL_UPSERT_PROGRESS = '''
+    INSERT INTO progress (user_id, path, current_time, duration, last_played, play_count)
+    VALUES (?, ?, ?, ?, ?, 0)
+    ON CONFLICT(user_id, path) DO UPDATE SET
+        current_time = excluded.current_time,
+        duration = COALESCE(NULLIF(excluded.duration, 0), progress.duration),
+        last_played = excluded.last_played
+'''
+# First play of an untracked file starts its row; later plays only bump the count
+_SQL_INCREMENT_PLAY_COUNT = '''
+    INSERT INTO progress (user_id, path, current_time, duration, play_count, last_played)
+    VALUES (?, ?, 0, 0, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id, path) DO UPDATE SET
+        play_count = COALESCE(progress.play_count, 0) + 1
+'''
+_SQL_GET_PROGRESS = '''
+    SELECT "current_time", duration, last_played
+    FROM progress
+    WHERE user_id = ? AND path = ?
+'''
+_SQL_GET_ALL_PROGRESS = '''
+    SELECT path, "current_time", duration, last_played
+    FROM progress
+    WHERE user_id = ?
+'''
+
+# Players report their position every few seconds and only the latest one
+# per (user, path) matters. update_progress() parks it here; flush_progress()
+# writes whatever is pending in one transaction: every PROGRESS_FLUSH_SECONDS
+# from the scheduler, before any other helper changes progress, and at
+# shutdown. Readers do not flush (that would take the writer on every page
+# load while something plays); they lay the pending positions over what they
+# read instead, see _pending_progress().
+PROGRESS_FLUSH_SECONDS = 5
+_progress_buffer: Dict[tuple, tuple] = {}
+_progress_buffer_lock = threading.Lock()
+
 def update_progress(user_id: int, path: str, current_time: float, duration: float):
-    conn = get_db()
-    try:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO progress (user_id, path, current_time, duration, last_played, play_count)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, 0)
-            ON CONFLICT(user_id, path) DO UPDATE SET
-                current_time = excluded.current_time,
-                duration = COALESCE(NULLIF(excluded.duration, 0), progress.duration),
-                last_played = CURRENT_TIMESTAMP
-        ''', (user_id, path, current_time, duration))
-        conn.commit()
+    # The REAL columns hand back floats; buffered values read back through
+    # _apply_pending() must have the same type
+    current_time = float(current_time) if current_time is not None else None
+    duration = float(duration) if duration is not None else None
+    # CURRENT_TIMESTAMP's UTC text format
+    played_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    if _in_bulk():
+        # Part of the caller's transaction, committed or rolled back with it
+        conn = get_write_db()
+        try:
+            conn.execute(_SQL_UPSERT_PROGRESS, (user_id, path, current_time, duration, played_at))
+        finally:
+            return_db(conn)
+        return
+    with _progress_buffer_lock:
+        _progress_buffer[(user_id, path)] = (current_time, duration, played_at)
+
+def flush_progress():
+    """Write buffered update_progress() calls to the progress table."""
+    if not _progress_buffer:
+        return
+    # Snapshot while holding the writer, and drop entries only once they are
+    # written: a concurrent flush waits here and then finds nothing left,
+    # rather than reading progress before this one has committed
+    conn = get_write_db()
+    try:
+        with _progress_buffer_lock:
+            pending = dict(_progress_buffer)
+        if not pending:
+            return
+        _begin(conn)
+        conn.executemany(_SQL_UPSERT_PROGRESS, [
+            (user_id, path, current_time, duration, played_at)
+            for (user_id, path), (current_time, duration, played_at) in pending.items()
+        ])
+        _commit(conn)
+        with _progress_buffer_lock:
+            for key, value in pending.items():
+                # Keep positions reported while this batch was being written
+                if _progress_buffer.get(key) is value:
+                    del _progress_buffer[key]
     finally:
         return_db(conn)
 
+def _pending_progress(user_id: int) -> Dict[str, tuple]:
+    """Positions buffered for one user and not flushed yet, keyed by path.
+
+    Take this before querying: a flush that lands in between leaves the rows
+    and the snapshot agreeing, whereas a snapshot taken after the query could
+    miss positions that were still buffered when the rows were read.
+    """
+    if not _progress_buffer:
+        return {}
+    with _progress_buffer_lock:
+        return {path: value for (uid, path), value in _progress_buffer.items() if uid == user_id}
+
+def _apply_pending(row: Optional[dict], pending: tuple) -> dict:
+    """Update a progress row (a dict) the way flush_progress() will.
+
+    With no stored row, returns the columns the flush would insert.
+    """
+    current_time, duration, played_at = pending
+    if row is None:
+        return {"current_time": current_time, "duration": duration, "last_played": played_at}
+    row["current_time"] = current_time
+    if duration:
+        # As in _SQL_UPSERT_PROGRESS, a report without a duration keeps the stored one
+        row["duration"] = duration
+    row["last_played"] = played_at
+    return row
+
+def _overlay_pending(rows: Dict[str, dict], pending: Dict[str, tuple], **new_cols):
+    """Apply pending positions to rows keyed by path, adding rows that are missing."""
+    for path, value in pending.items():
+        row = rows.get(path)
+        if row is None:
+            rows[path] = {"path": path, **_apply_pending(None, value), **new_cols}
+        else:
+            _apply_pending(row, value)
+
+# Pending positions as a table, for queries that sort or aggregate on progress
+# in SQL. Bound as one JSON array of [path, current_time, duration,
+# last_played]; joined as "b" next to progress "p", the _PENDING_* expressions
+# give what the row will hold once flushed.
+_SQL_PENDING_PROGRESS = '''
+    WITH pending(path, "current_time", duration, last_played) AS (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+               json_extract(value, '$[2]'), json_extract(value, '$[3]')
+        FROM json_each(?)
+    )
+'''
+_STORED_PROGRESS_COLUMNS = '''
+    p."current_time" AS "current_time", p.duration AS duration,
+    p.play_count AS play_count, p.last_played AS last_played'''
+_PENDING_LAST_PLAYED = "COALESCE(b.last_played, p.last_played)"
+_PENDING_PROGRESS_COLUMNS = f'''
+    CASE WHEN b.path IS NULL THEN p."current_time" ELSE b."current_time" END AS "current_time",
+    CASE WHEN b.path IS NOT NULL AND (b.duration OR p.path IS NULL) THEN b.duration ELSE p.duration END AS duration,
+    CASE WHEN b.path IS NOT NULL AND p.path IS NULL THEN 0 ELSE p.play_count END AS play_count,
+    {_PENDING_LAST_PLAYED} AS last_played'''
+
+def _pending_json(pending: Dict[str, tuple]) -> str:
+    return json.dumps([[path, *value] for path, value in pending.items()])
+
 def increment_play_count(user_id: int, path: str):
-    conn = get_db()
+    flush_progress()
+    conn = get_write_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            UPDATE progress SET play_count = play_count + 1 
-            WHERE user_id = ? AND path = ?
-        ''', (user_id, path))
-        if c.rowcount == 0:
-            c.execute('''
-                INSERT INTO progress (user_id, path, current_time, duration, play_count, last_played)
-                VALUES (?, ?, 0, 0, 1, CURRENT_TIMESTAMP)
-            ''', (user_id, path))
-        conn.commit()
+        conn.execute(_SQL_INCREMENT_PLAY_COUNT, (user_id, path))
+        _commit(conn)
+    finally:
+        return_db(conn)
+
+# Fraction of the duration after which a play counts as finished
+PLAY_FINISHED_FRACTION = 0.95
+
+# The same upsert, but an existing row only counts if its stored position was
+# not already past the end: reports keep arriving every few seconds through
+# the credits, and only the first one to cross the line is a new play
+_SQL_COUNT_FINISHED_PLAY = _SQL_INCREMENT_PLAY_COUNT + '''
+    WHERE NOT (progress.duration > 0 AND progress."current_time" > progress.duration * ?)
+'''
+
+def count_finished_play(user_id: int, path: str):
+    """Count a play the first time progress crosses PLAY_FINISHED_FRACTION.
+
+    Call before update_progress() stores the crossing position.
+    """
+    flush_progress()
+    conn = get_write_db()
+    try:
+        conn.execute(_SQL_COUNT_FINISHED_PLAY, (user_id, path, PLAY_FINISHED_FRACTION))
+        _commit(conn)
     finally:
         return_db(conn)
 
 def get_progress(user_id: int, path: str) -> Optional[dict]:
+    with _progress_buffer_lock:
+        pending = _progress_buffer.get((user_id, path))
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            SELECT current_time, duration, last_played 
-            FROM progress 
-            WHERE user_id = ? AND path = ?
-        ''', (user_id, path))
-        row = c.fetchone()
-        if row:
-            return dict(row)
-        return None
+        row = conn.execute(_SQL_GET_PROGRESS, (user_id, path)).fetchone()
+        row = dict(row) if row else None
     finally:
         return_db(conn)
+    if pending:
+        return _apply_pending(row, pending)
+    return row
 
 def get_all_progress(user_id: int):
+    pending = _pending_progress(user_id)
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            SELECT path, current_time, duration, last_played 
-            FROM progress 
-            WHERE user_id = ?
-        ''', (user_id,))
-        rows = c.fetchall()
-        return {row['path']: dict(row) for row in rows}
+        # Build the dict straight off the cursor rather than via a fetchall() list
+        result = {row['path']: dict(row) for row in conn.execute(_SQL_GET_ALL_PROGRESS, (user_id,))}
+    finally:
+        return_db(conn)
+    _overlay_pending(result, pending)
+    return result
+
+# Started but not finished: more than 10s in and more than 10s left (or no
+# known duration), newest first along idx_progress_user_lastplayed
+_SQL_RECENT_PROGRESS_WHERE = '''
+    SELECT path, "current_time", duration, last_played
+    FROM progress
+    WHERE user_id = ? AND "current_time" > 10
+      AND (COALESCE(duration, 0) <= 0 OR duration - "current_time" > 10)
+'''
+_SQL_GET_RECENT_PROGRESS = _SQL_RECENT_PROGRESS_WHERE + '''
+    ORDER BY last_played DESC
+    LIMIT ? OFFSET ?
+'''
+# The same, leaving out the paths with pending positions
+_SQL_GET_RECENT_PROGRESS_EXCEPT = _SQL_RECENT_PROGRESS_WHERE + '''
+      AND path NOT IN (SELECT value FROM json_each(?))
+    ORDER BY last_played DESC
+    LIMIT ?
+'''
+
+def _is_unfinished(row: dict) -> bool:
+    """_SQL_RECENT_PROGRESS_WHERE's test, for rows built in Python."""
+    current_time = row["current_time"] or 0
+    duration = row["duration"] or 0
+    return current_time > 10 and (duration <= 0 or duration - current_time > 10)
+
+def get_recent_progress(user_id: int, limit: int = 50, offset: int = 0) -> List[dict]:
+    """One page of a user's unfinished items, most recently played first."""
+    pending = _pending_progress(user_id)
+    conn = get_db()
+    try:
+        if not pending:
+            return [dict(row) for row in conn.execute(_SQL_GET_RECENT_PROGRESS, (user_id, limit, offset))]
+        # Pending paths were all just played, so they rank near the top: take
+        # the stored rows up to the end of this page without them, then merge
+        # the pending ones in by last_played
+        paths = json.dumps(list(pending))
+        rows = [dict(row) for row in conn.execute(_SQL_GET_RECENT_PROGRESS_EXCEPT, (user_id, paths, offset + limit))]
+        stored = {row['path']: dict(row) for row in conn.execute(_SQL_GET_PROGRESS_IN, (user_id, paths))}
+    finally:
+        return_db(conn)
+    _overlay_pending(stored, pending)
+    rows += [
+        {"path": row["path"], "current_time": row["current_time"], "duration": row["duration"], "last_played": row["last_played"]}
+        for row in stored.values() if _is_unfinished(row)
+    ]
+    rows.sort(key=lambda row: row["last_played"] or "", reverse=True)
+    return rows[offset:offset + limit]
+
+# Most paths looked up by key in one query; longer lists are matched
+# against the user's rows instead
+_PROGRESS_IN_MAX = 500
+
+_SQL_GET_PROGRESS_MANY = '''
+    SELECT path, "current_time", duration, play_count, last_played
+    FROM progress
+    WHERE user_id = ?
+'''
+# The paths travel as one JSON array, so the statement text is the same for
+# any number of them and stays prepared in the connection's statement cache
+# (an IN list of ? per path is a new statement for every list length)
+_SQL_GET_PROGRESS_IN = _SQL_GET_PROGRESS_MANY + '    AND path IN (SELECT value FROM json_each(?))\n'
+
+def get_progress_many(user_id: int, paths) -> Dict[str, dict]:
+    """Progress for just the given paths, keyed by path like get_all_progress."""
+    paths = list(dict.fromkeys(p for p in paths if p))
+    result = {}
+    if not paths:
+        return result
+    pending = _pending_progress(user_id)
+    conn = get_db()
+    try:
+        if len(paths) > _PROGRESS_IN_MAX:
+            # A whole category (the shows library view) or a very long page:
+            # one walk over the user's own rows on the primary key is much
+            # cheaper than a key lookup per listed path, as a user has
+            # progress for a fraction of the library at most
+            wanted = set(paths)
+            for row in conn.execute(_SQL_GET_PROGRESS_MANY, (user_id,)):
+                if row['path'] in wanted:
+                    result[row['path']] = dict(row)
+        else:
+            for row in conn.execute(_SQL_GET_PROGRESS_IN, (user_id, json.dumps(paths))):
+                result[row['path']] = dict(row)
     finally:
         return_db(conn)
+    if pending:
+        wanted = set(paths)
+        _overlay_pending(result, {p: v for p, v in pending.items() if p in wanted}, play_count=0)
+    return result
+
+_SQL_GET_FILE_METADATA = 'SELECT * FROM file_metadata WHERE path = ?'
+# The searchable columns are filled from the JSON inside SQLite, so meta_json
+# is the only value that has to be built and bound from Python
+_SQL_UPSERT_FILE_METADATA = '''
+    INSERT INTO file_metadata (path, media_type, title, year, imdb_id, poster, plot, rated, runtime, genre, meta_json, fetched_at)
+    VALUES (
+        ?1, ?2,
+        json_extract(?3, '$.Title'), json_extract(?3, '$.Year'), json_extract(?3, '$.imdbID'),
+        json_extract(?3, '$.Poster'), json_extract(?3, '$.Plot'), json_extract(?3, '$.Rated'),
+        json_extract(?3, '$.Runtime'), json_extract(?3, '$.Genre'),
+        ?3, CURRENT_TIMESTAMP
+    )
+    ON CONFLICT(path) DO UPDATE SET
+        media_type = excluded.media_type,
+        title = excluded.title,
+        year = excluded.year,
+        imdb_id = excluded.imdb_id,
+        poster = excluded.poster,
+        plot = excluded.plot,
+        rated = excluded.rated,
+        runtime = excluded.runtime,
+        genre = excluded.genre,
+        meta_json = excluded.meta_json,
+        fetched_at = CURRENT_TIMESTAMP
+'''
 
 def get_file_metadata(path: str) -> Optional[dict]:
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('SELECT * FROM file_metadata WHERE path = ?', (path,))
-        row = c.fetchone()
+        row = conn.execute(_SQL_GET_FILE_METADATA, (path,)).fetchone()
         if not row:
             return None
         data = dict(row)
-        meta_raw = data.get("meta_json")
+        # Callers get the parsed "meta"; returning the raw text as well would
+        # send the OMDb payload twice in every metadata response
+        meta_raw = data.pop("meta_json", None)
         if isinstance(meta_raw, str) and meta_raw:
             try:
-                data["meta"] = json.loads(meta_raw)
+                data["meta"] = _json_loads(meta_raw)
             except Exception:
                 data["meta"] = None
         else:
@@ -544,123 +1510,140 @@ def get_file_metadata(path: str) -> Optional[dict]:
     finally:
         return_db(conn)
 
-def upsert_file_metadata(path: str, media_type: str, meta: dict):
-    title = meta.get("Title")
-    year = meta.get("Year")
-    imdb_id = meta.get("imdbID")
-    poster = meta.get("Poster")
-    plot = meta.get("Plot")
-    rated = meta.get("Rated")
-    runtime = meta.get("Runtime")
-    genre = meta.get("Genre")
-    meta_json = json.dumps(meta, ensure_ascii=False)
+# Every column stored ahead of meta_json. SQLite decodes a record only as far
+# as the last column requested, so a lookup that stops here never follows a
+# large OMDb payload onto its overflow pages.
+_SQL_GET_FILE_METADATA_LITE = '''
+    SELECT path, media_type, title, year, imdb_id, poster, plot, rated, runtime, genre
+    FROM file_metadata WHERE path = ?
+'''
+
+def get_file_metadata_lite(path: str) -> Optional[dict]:
+    """Cached metadata columns without the raw OMDb JSON (no "meta" key).
 
+    For scans and list tiles; get_file_metadata() is for the detail view.
+    """
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO file_metadata (path, media_type, title, year, imdb_id, poster, plot, rated, runtime, genre, meta_json, fetched_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(path) DO UPDATE SET
-                media_type = excluded.media_type,
-                title = excluded.title,
-                year = excluded.year,
-                imdb_id = excluded.imdb_id,
-                poster = excluded.poster,
-                plot = excluded.plot,
-                rated = excluded.rated,
-                runtime = excluded.runtime,
-                genre = excluded.genre,
-                meta_json = excluded.meta_json,
-                fetched_at = CURRENT_TIMESTAMP
-        ''', (path, media_type, title, year, imdb_id, poster, plot, rated, runtime, genre, meta_json))
-        conn.commit()
+        row = conn.execute(_SQL_GET_FILE_METADATA_LITE, (path,)).fetchone()
+        return dict(row) if row else None
     finally:
         return_db(conn)
 
-def upsert_library_index_item(item: dict):
+# Stored poster, else the OMDb Poster field, without decoding meta_json in Python
+_SQL_GET_FILE_METADATA_POSTER = '''
+    SELECT COALESCE(
+        NULLIF(poster, ''),
+        CASE WHEN json_valid(meta_json) THEN NULLIF(json_extract(meta_json, '$.Poster'), 'N/A') END
+    )
+    FROM file_metadata WHERE path = ?
+'''
+
+def get_file_metadata_poster(path: str) -> Optional[str]:
+    """Poster URL from cached metadata, for callers that need nothing else."""
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO library_index (path, category, name, folder, source, poster, mtime, size, genre, year, indexed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(path) DO UPDATE SET
-                category = excluded.category,
-                name = excluded.name,
-                folder = excluded.folder,
-                source = excluded.source,
-                poster = excluded.poster,
-                mtime = excluded.mtime,
-                size = excluded.size,
-                genre = excluded.genre,
-                year = excluded.year,
-                indexed_at = CURRENT_TIMESTAMP
-        ''', (
-            item.get("path"),
-            item.get("category"),
-            item.get("name"),
-            item.get("folder"),
-            item.get("source"),
-            item.get("poster"),
-            item.get("mtime"),
-            item.get("size"),
-            item.get("genre"),
-            item.get("year"),
-        ))
-        conn.commit()
+        row = conn.execute(_SQL_GET_FILE_METADATA_POSTER, (path,)).fetchone()
+        return row[0] if row else None
+    finally:
+        return_db(conn)
+
+def upsert_file_metadata(path: str, media_type: str, meta: dict):
+    meta_json = _json_dumps(meta)
+
+    conn = get_write_db()
+    try:
+        conn.execute(_SQL_UPSERT_FILE_METADATA, (path, media_type, meta_json))
+        _commit(conn)
     finally:
         return_db(conn)
 
+def upsert_library_index_item(item: dict):
+    upsert_library_index_items([item])
+
 def delete_library_index_item(path: str):
-    conn = get_db()
+    delete_library_index_items([path])
+
+def delete_library_index_items(paths: list):
+    """Delete files from library_index, file_metadata and progress in one transaction.
+
+    Callers removing several files should collect the paths and call this once
+    rather than looping over delete_library_index_item().
+    """
+    if not paths:
+        return
+    rows = [(p,) for p in paths]
+    flush_progress()
+    conn = get_write_db()
     try:
+        _begin(conn)
         c = conn.cursor()
-        c.execute("DELETE FROM library_index WHERE path = ?", (path,))
-        c.execute("DELETE FROM file_metadata WHERE path = ?", (path,))
-        c.execute("DELETE FROM progress WHERE path = ?", (path,))
-        conn.commit()
+        c.executemany("DELETE FROM library_index WHERE path = ?", rows)
+        c.executemany("DELETE FROM file_metadata WHERE path = ?", rows)
+        c.executemany("DELETE FROM progress WHERE path = ?", rows)
+        _commit(conn)
+    except Exception:
+        _rollback(conn)
+        raise
     finally:
         return_db(conn)
 
 def delete_library_index_items_by_prefix(path_prefix: str):
-    """Delete all items from library_index, file_metadata, and progress starting with path_prefix"""
-    conn = get_db()
-    try:
+    """Delete a directory and everything below it from library_index, file_metadata, and progress"""
+    dir_path = path_prefix.rstrip('/')
+    # Path range rather than LIKE, as in rename_media_path: '%' and '_' in
+    # folder names are not wildcards, and the path indexes can be used
+    params = (dir_path, dir_path + '/', dir_path + '0')
+    flush_progress()
+    conn = get_write_db()
+    try:
+        _begin(conn)
         c = conn.cursor()
-        # Ensure prefix ends with / to only match sub-items
-        if not path_prefix.endswith('/'):
-            path_prefix += '/'
-        
-        pattern = path_prefix + '%'
-        c.execute("DELETE FROM library_index WHERE path LIKE ?", (pattern,))
-        c.execute("DELETE FROM file_metadata WHERE path LIKE ?", (pattern,))
-        c.execute("DELETE FROM progress WHERE path LIKE ?", (pattern,))
-        
-        # Also delete the directory itself if it matches the prefix (without trailing slash)
-        dir_path = path_prefix.rstrip('/')
-        c.execute("DELETE FROM library_index WHERE path = ?", (dir_path,))
-        c.execute("DELETE FROM file_metadata WHERE path = ?", (dir_path,))
-        c.execute("DELETE FROM progress WHERE path = ?", (dir_path,))
-        
-        conn.commit()
+        for table in ("library_index", "file_metadata", "progress"):
+            c.execute(f"DELETE FROM {table} WHERE path = ? OR (path > ? AND path < ?)", params)
+        _commit(conn)
+    except Exception:
+        _rollback(conn)
+        raise
     finally:
         return_db(conn)
 
+# Copy kept when fixing duplicates: the shortest path (likely already
+# organized, e.g. /data/movies/Title/Title.mkv rather than
+# /data/uploads/temp/Title.mkv), then alphabetical to be deterministic
+_DUPLICATE_KEEP_ORDER = "length(path), path"
+
+def _duplicate_keep_key(path: str) -> tuple:
+    """_DUPLICATE_KEEP_ORDER in Python (str order matches SQLite's BINARY on UTF-8)."""
+    return (len(path), path)
+
+def _duplicate_groups(rows) -> List[dict]:
+    groups = []
+    for row in rows:
+        d = dict(row)
+        # json_group_array's order is not defined, so sort here
+        d["paths"] = sorted(_json_loads(d.pop("paths_json")), key=_duplicate_keep_key)
+        groups.append(d)
+    return groups
+
 def find_duplicate_files() -> List[dict]:
-    """Find files with the same name and size across the entire library."""
+    """Find files with the same name and size across the entire library.
+
+    ``paths`` is a list, with the copy fix_duplicate_files() would keep first.
+    """
     conn = get_db()
     try:
         c = conn.cursor()
+        # json_group_array keeps paths intact whatever characters they hold
         c.execute('''
-            SELECT name, size, category, GROUP_CONCAT(path, '|') as paths, COUNT(*) as count
+            SELECT name, size, category, json_group_array(path) as paths_json, COUNT(*) as count
             FROM library_index
             WHERE category NOT IN ('music', 'books') -- Skip small files that might have common names
             GROUP BY name, size
             HAVING count > 1
             ORDER BY count DESC
         ''')
-        return [dict(row) for row in c.fetchall()]
+        return _duplicate_groups(c)
     finally:
         return_db(conn)
 
@@ -671,7 +1654,7 @@ def find_duplicate_metadata() -> List[dict]:
     try:
         c = conn.cursor()
         c.execute('''
-            SELECT imdb_id, title, media_type, GROUP_CONCAT(path, '|') as paths, COUNT(*) as count
+            SELECT imdb_id, title, media_type, json_group_array(path) as paths_json, COUNT(*) as count
             FROM file_metadata
             WHERE imdb_id IS NOT NULL AND imdb_id != 'N/A' AND imdb_id != ''
             AND media_type != 'series'
@@ -679,103 +1662,225 @@ def find_duplicate_metadata() -> List[dict]:
             HAVING count > 1
             ORDER BY count DESC
         ''')
-        return [dict(row) for row in c.fetchall()]
+        return _duplicate_groups(c)
     finally:
         return_db(conn)
 
+# Every copy after the first in keep order is surplus
+_SQL_SURPLUS_DUPLICATE_FILES = f'''
+    SELECT path FROM (
+        SELECT path, ROW_NUMBER() OVER (PARTITION BY name, size ORDER BY {_DUPLICATE_KEEP_ORDER}) AS rn
+        FROM library_index
+        WHERE category NOT IN ('music', 'books')
+    )
+    WHERE rn > 1
+'''
+_SQL_SURPLUS_DUPLICATE_CONTENT = f'''
+    SELECT path FROM (
+        SELECT path, ROW_NUMBER() OVER (PARTITION BY imdb_id ORDER BY {_DUPLICATE_KEEP_ORDER}) AS rn
+        FROM file_metadata
+        WHERE imdb_id IS NOT NULL AND imdb_id != 'N/A' AND imdb_id != ''
+        AND media_type != 'series'
+    )
+    WHERE rn > 1
+'''
+
 def fix_duplicate_files() -> List[str]:
     """
     Find duplicate files (same name and size) and return a list of paths to delete.
     Keeps the one with the shortest path (likely already organized).
     """
-    dupes = find_duplicate_files()
-    to_delete = []
-    for d in dupes:
-        paths = d["paths"].split("|")
-        # Sort by path length and then alphabetically to be deterministic
-        # Shorter paths (like /data/movies/Title/Title.mkv) are preferred over 
-        # longer/temporary ones (like /data/uploads/temp/Title.mkv)
-        paths.sort(key=lambda x: (len(x), x))
-        # Keep the first one, delete the rest
-        to_delete.extend(paths[1:])
-    return to_delete
+    conn = get_db()
+    try:
+        return [row[0] for row in conn.execute(_SQL_SURPLUS_DUPLICATE_FILES)]
+    finally:
+        return_db(conn)
 
 def fix_duplicate_content() -> List[str]:
     """
     Find duplicate content (same IMDb ID) and return a list of paths to delete.
     Keeps the one with the shortest path.
     """
-    dupes = find_duplicate_metadata()
-    to_delete = []
-    for d in dupes:
-        paths = d["paths"].split("|")
-        paths.sort(key=lambda x: (len(x), x))
-        to_delete.extend(paths[1:])
-    return to_delete
+    conn = get_db()
+    try:
+        return [row[0] for row in conn.execute(_SQL_SURPLUS_DUPLICATE_CONTENT)]
+    finally:
+        return_db(conn)
+
+def fix_duplicates() -> List[str]:
+    """Paths fix_duplicate_files() or fix_duplicate_content() would delete.
+
+    One query; UNION drops a path that is surplus on both counts.
+    """
+    conn = get_db()
+    try:
+        return [row[0] for row in conn.execute(
+            f"{_SQL_SURPLUS_DUPLICATE_FILES} UNION {_SQL_SURPLUS_DUPLICATE_CONTENT}"
+        )]
+    finally:
+        return_db(conn)
+
+# Pairs already present are left alone; library_genres_au cleared the old ones
+# of any row whose genre changed
+_SQL_INSERT_LIBRARY_GENRE = "INSERT OR IGNORE INTO library_genres (path, category, genre) VALUES (?, ?, ?)"
+
+_SQL_UPSERT_LIBRARY_INDEX = '''
+    INSERT INTO library_index (path, category, name, folder, source, poster, mtime, size, genre, year, name_lc, folder_lc, name_sort, folder_sort, show_name, show_sort, indexed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(path) DO UPDATE SET
+        category = excluded.category,
+        name = excluded.name,
+        folder = excluded.folder,
+        name_lc = excluded.name_lc,
+        folder_lc = excluded.folder_lc,
+        name_sort = excluded.name_sort,
+        folder_sort = excluded.folder_sort,
+        show_name = excluded.show_name,
+        show_sort = excluded.show_sort,
+        source = excluded.source,
+        poster = excluded.poster,
+        mtime = excluded.mtime,
+        size = excluded.size,
+        genre = excluded.genre,
+        year = excluded.year,
+        indexed_at = CURRENT_TIMESTAMP
+'''
+
+# Rows per library_index write transaction: large enough that commits are
+# rare during a scan, small enough that the writer is not held for seconds
+LIBRARY_INDEX_BATCH_SIZE = 1000
 
 def upsert_library_index_items(items: list):
+    """Upsert library_index rows, one transaction per LIBRARY_INDEX_BATCH_SIZE.
+
+    executemany binds every row separately, so the batch size is not bounded
+    by SQLite's host-parameter limit. Callers that index several files should
+    collect them and call this once instead of looping over
+    upsert_library_index_item(), which would commit once per file. Between
+    batches the writer is released so progress saves are not stuck behind a
+    long list; inside bulk() every batch joins the block's transaction.
+    """
     if not items:
         return
-    conn = get_db()
-    try:
-        c = conn.cursor()
-        c.executemany('''
-            INSERT INTO library_index (path, category, name, folder, source, poster, mtime, size, genre, year, indexed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(path) DO UPDATE SET
-                category = excluded.category,
-                name = excluded.name,
-                folder = excluded.folder,
-                source = excluded.source,
-                poster = excluded.poster,
-                mtime = excluded.mtime,
-                size = excluded.size,
-                genre = excluded.genre,
-                year = excluded.year,
-                indexed_at = CURRENT_TIMESTAMP
-        ''', ((
-            it.get("path"),
-            it.get("category"),
-            it.get("name"),
-            it.get("folder"),
-            it.get("source"),
-            it.get("poster"),
-            it.get("mtime"),
-            it.get("size"),
-            it.get("genre"),
-            it.get("year"),
-        ) for it in items))
-        conn.commit()
+    if len(items) > LIBRARY_INDEX_BATCH_SIZE:
+        for i in range(0, len(items), LIBRARY_INDEX_BATCH_SIZE):
+            upsert_library_index_items(items[i:i + LIBRARY_INDEX_BATCH_SIZE])
+        return
+    # Build the parameter tuples before taking the writer, so the lock only
+    # covers the executemany itself and not the per-item dict lookups.
+    # Episodes of a season share their folder and usually their genre string,
+    # so those are derived once per distinct value in the batch.
+    folder_keys = {}
+    genre_parts = {}
+    rows = []
+    genre_rows = []
+    for it in items:
+        path, category, name, folder, genre = it.get("path"), it.get("category"), it.get("name"), it.get("folder"), it.get("genre")
+        fk = folder_keys.get(folder)
+        if fk is None:
+            fk = folder_keys[folder] = ((folder or "").lower(), natural_sort_key_text(folder))
+        show = library_show_name(name, folder) if category == "shows" else None
+        rows.append((
+            path, category, name, folder,
+            it.get("source"), it.get("poster"), it.get("mtime"), it.get("size"),
+            genre, it.get("year"),
+            (name or "").lower(), fk[0],
+            natural_sort_key_text(name), fk[1],
+            show, natural_sort_key_text(show) if show is not None else None,
+        ))
+        if genre:
+            parts = genre_parts.get(genre)
+            if parts is None:
+                parts = genre_parts[genre] = split_genres(genre)
+            genre_rows.extend((path, category, g) for g in parts)
+    conn = get_write_db()
+    try:
+        _begin(conn)
+        conn.executemany(_SQL_UPSERT_LIBRARY_INDEX, rows)
+        if genre_rows:
+            conn.executemany(_SQL_INSERT_LIBRARY_GENRE, genre_rows)
+        _commit(conn)
+    finally:
+        return_db(conn)
+
+def update_library_index_metadata(path: str, genre: str = None, year: str = None, poster: str = None):
+    """Store fetched genre, year and poster on an already indexed file.
+
+    Only those columns change. An upsert would also reset category, name,
+    folder and the derived sort and show_name columns, dropping the file out
+    of its category listing and its show until the next scan.
+    """
+    conn = get_write_db()
+    try:
+        _begin(conn)
+        row = conn.execute('SELECT category FROM library_index WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        conn.execute(
+            'UPDATE library_index SET genre = ?, year = ?, poster = ?, indexed_at = CURRENT_TIMESTAMP WHERE path = ?',
+            (genre, year, poster, path),
+        )
+        if genre:
+            conn.executemany(_SQL_INSERT_LIBRARY_GENRE, [(path, row["category"], g) for g in split_genres(genre)])
+        _commit(conn)
     finally:
         return_db(conn)
 
 def clear_library_index_category(category: str):
-    conn = get_db()
+    conn = get_write_db()
     try:
+        _begin(conn, immediate=True)
         c = conn.cursor()
         c.execute('DELETE FROM library_index WHERE category = ?', (category,))
         c.execute('DELETE FROM library_index_state WHERE category = ?', (category,))
-        conn.commit()
+        _commit(conn)
+    except Exception:
+        _rollback(conn)
+        raise
     finally:
         return_db(conn)
+        _invalidate_index_state(category)
 
 def remove_stale_library_entries(category: str, current_paths: set):
     """Remove library index entries whose paths are no longer on disk."""
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('SELECT path FROM library_index WHERE category = ?', (category,))
-        rows = c.fetchall()
-        stale = [r['path'] for r in rows if r['path'] not in current_paths]
+        stale = [(r['path'],) for r in c if r['path'] not in current_paths]
         if stale:
-            placeholders = ','.join('?' for _ in stale)
-            c.execute(f'DELETE FROM library_index WHERE category = ? AND path IN ({placeholders})', [category] + stale)
-            conn.commit()
+            # One primary-key delete per path rather than a single IN (...)
+            # list, which needs a bound parameter per path: a drive that went
+            # missing can leave more stale rows than SQLite builds before
+            # 3.32 allow (999)
+            _begin(conn)
+            c.executemany('DELETE FROM library_index WHERE path = ?', stale)
+            _commit(conn)
     finally:
         return_db(conn)
 
+# Index state is checked on every library page (is a build due?) and changes
+# once per scan, so it is cached the same way as settings: writers drop the
+# category and bump the generation, a read that raced a write is not kept,
+# and entries expire after CACHE_TTL_SECONDS.
+_index_state_cache: Dict[str, tuple] = {}
+_index_state_generation = 0
+_index_state_lock = threading.Lock()
+
+def _invalidate_index_state(category: str):
+    global _index_state_generation
+    with _index_state_lock:
+        _index_state_cache.pop(category, None)
+        _index_state_generation += 1
+
+def _clear_index_state_cache():
+    global _index_state_generation
+    with _index_state_lock:
+        _index_state_cache.clear()
+        _index_state_generation += 1
+
 def set_library_index_state(category: str, item_count: int):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('''
@@ -785,9 +1890,14 @@ def set_library_index_state(category: str, item_count: int):
                 scanned_at = CURRENT_TIMESTAMP,
                 item_count = excluded.item_count
         ''', (category, int(item_count or 0)))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
+        _invalidate_index_state(category)
+
+# Trailing extension and "(1999)" year, stripped from a name before matching
+_EXT_RE = re.compile(r'\.\w+$')
+_YEAR_PAREN_RE = re.compile(r'\(\d{4}\)')
 
 def get_similar_media(path: str, limit: int = 10) -> List[Dict]:
     """Find similar media items using lightweight SQL keyword matching."""
@@ -808,43 +1918,104 @@ def get_similar_media(path: str, limit: int = 10) -> List[Dict]:
             
         category = target['category']
         # Clean title for matching (remove year and extension)
-        target_name = re.sub(r'\.\w+$', '', target['name'])
-        target_name = re.sub(r'\(\d{4}\)', '', target_name).strip()
+        target_name = _EXT_RE.sub('', target['name'])
+        target_name = _YEAR_PAREN_RE.sub('', target_name).strip()
         
         # Get first genre
-        genres = (target['meta_genre'] or target['genre'] or "").split(',')
-        primary_genre = genres[0].strip() if genres else None
+        genres = split_genres(target['meta_genre'] or target['genre'])
+        primary_genre = genres[0] if genres else None
         
         # 2. Find similar items via SQL (much lighter than TF-IDF on Pi Zero)
         # Priority: Same primary genre AND similar title words
-        query = '''
-            SELECT l.path, l.name, l.poster, l.genre, l.year
-            FROM library_index l
-            LEFT JOIN file_metadata m ON l.path = m.path
-            WHERE l.category = ? AND l.path != ?
-            ORDER BY 
-                (CASE WHEN l.genre LIKE ? THEN 5 ELSE 0 END) + 
-                (CASE WHEN l.name LIKE ? THEN 3 ELSE 0 END) DESC
-            LIMIT ?
-        '''
-        
-        genre_param = f"%{primary_genre}%" if primary_genre else "%"
         # Take first word of title for simple matching
         title_word = target_name.split(' ')[0] if ' ' in target_name else target_name
-        title_param = f"%{title_word}%"
-        
-        c.execute(query, (category, path, genre_param, title_param, limit))
-        return [dict(r) for r in c.fetchall()]
+
+        # Only rows sharing the genre or the title word are scored: the genre
+        # through library_genres, the word through the FTS index (LIKE when
+        # FTS5 is missing), instead of scoring every row of the category
+        matches = []
+        params = []
+        if primary_genre:
+            matches.append(('l.path IN (SELECT path FROM library_genres WHERE category = ? AND genre = ?)', 5))
+            params.append((category, primary_genre))
+        title_match = _fts_match_query(title_word, column="name") if _fts_enabled else None
+        if title_match:
+            matches.append(('l.rowid IN (SELECT rowid FROM library_fts WHERE library_fts MATCH ?)', 3))
+            params.append((title_match,))
+        elif title_word:
+            matches.append(('l.name LIKE ? ESCAPE "\\"', 3))
+            params.append((f"%{sanitize_like_pattern(title_word)}%",))
+
+        items = []
+        if matches:
+            score_sql = " + ".join(f"(CASE WHEN {cond} THEN {weight} ELSE 0 END)" for cond, weight in matches)
+            any_sql = " OR ".join(cond for cond, _ in matches)
+            flat = [p for group in params for p in group]
+            c.execute(f'''
+                SELECT l.path, l.name, l.poster, l.genre, l.year
+                FROM library_index l
+                WHERE l.category = ? AND l.path != ? AND ({any_sql})
+                ORDER BY {score_sql} DESC
+                LIMIT ?
+            ''', [category, path] + flat + flat + [limit])
+            items = [dict(r) for r in c]
+
+        # Nothing in common with enough of the library: fill up with other
+        # items of the category, as the unfiltered ranking used to
+        if len(items) < limit:
+            seen = {item["path"] for item in items}
+            seen.add(path)
+            c.execute('''
+                SELECT l.path, l.name, l.poster, l.genre, l.year
+                FROM library_index l
+                WHERE l.category = ?
+                LIMIT ?
+            ''', (category, limit + len(seen)))
+            for r in c:
+                if r["path"] not in seen:
+                    items.append(dict(r))
+                    if len(items) >= limit:
+                        break
+        return items
     finally:
         return_db(conn)
 
 def get_library_index_state(category: str) -> Optional[dict]:
+    with _index_state_lock:
+        cached = _index_state_cache.get(category)
+        if cached is not None and cached[0] > time.monotonic():
+            state = cached[1]
+            # Callers get their own copy to modify
+            return dict(state) if state is not None else None
+        generation = _index_state_generation
     conn = get_db()
     try:
         c = conn.cursor()
         c.execute('SELECT category, scanned_at, item_count FROM library_index_state WHERE category = ?', (category,))
         row = c.fetchone()
-        return dict(row) if row else None
+        state = dict(row) if row else None
+    finally:
+        return_db(conn)
+    with _index_state_lock:
+        if generation == _index_state_generation:
+            _index_state_cache[category] = (
+                time.monotonic() + CACHE_TTL_SECONDS,
+                dict(state) if state is not None else None,
+            )
+    return state
+
+def count_library_index(categories: List[str]) -> Dict[str, int]:
+    """Number of indexed items per category, in one pass over the category index."""
+    placeholders = ",".join("?" for _ in categories)
+    conn = get_db()
+    try:
+        counts = dict.fromkeys(categories, 0)
+        for row in conn.execute(
+            f'SELECT category, COUNT(*) FROM library_index WHERE category IN ({placeholders}) GROUP BY category',
+            list(categories),
+        ):
+            counts[row[0]] = row[1]
+        return counts
     finally:
         return_db(conn)
 
@@ -852,15 +2023,10 @@ def get_unique_genres(category: str) -> List[str]:
     conn = get_db()
     try:
         c = conn.cursor()
-        c.execute('SELECT DISTINCT genre FROM library_index WHERE category = ? AND genre IS NOT NULL', (category,))
-        rows = c.fetchall()
-        genres = set()
-        for r in rows:
-            if r['genre']:
-                # Genres are often comma separated: "Action, Adventure"
-                parts = [p.strip() for p in r['genre'].split(',')]
-                genres.update(parts)
-        return sorted(list(genres))
+        # Genres are split into library_genres at upsert time, so this is a
+        # walk over idx_library_genres_category
+        c.execute('SELECT DISTINCT genre FROM library_genres WHERE category = ? ORDER BY genre', (category,))
+        return [r['genre'] for r in c]
     finally:
         return_db(conn)
 
@@ -869,301 +2035,508 @@ def get_unique_years(category: str) -> List[str]:
     try:
         c = conn.cursor()
         c.execute('SELECT DISTINCT year FROM library_index WHERE category = ? AND year IS NOT NULL ORDER BY year DESC', (category,))
-        return [r['year'] for r in c.fetchall() if r['year']]
+        return [r['year'] for r in c if r['year']]
     finally:
         return_db(conn)
 
-def query_library_index(category: str, q: str = None, offset: int = 0, limit: int = 50, sort: str = 'name', genre: str = None, year: str = None, user_id: int = None):
+# library_index columns returned to API callers (search helper columns omitted)
+_LIBRARY_INDEX_COLUMNS = "l.path, l.category, l.name, l.folder, l.source, l.poster, l.mtime, l.size, l.genre, l.year, l.indexed_at"
+
+def library_cursor(item: dict) -> str:
+    """Opaque ``after`` token that continues a name-sorted page after ``item``.
+
+    It carries the row's sort key as well as its path, so the next page does
+    not depend on that row still being indexed (a scan or a delete may have
+    removed or renamed it in between).
+    """
+    raw = json.dumps([natural_sort_key_text(item.get("name")), item.get("path")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _parse_library_cursor(after: str) -> Optional[tuple]:
+    """(name_sort, path) from a library_cursor() token, or None."""
+    try:
+        raw = base64.urlsafe_b64decode(after + "=" * (-len(after) % 4))
+        name_sort, path = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if isinstance(name_sort, str) and isinstance(path, str):
+        return name_sort, path
+    return None
+
+def query_library_index(category: str, q: str = None, offset: int = 0, limit: int = 50, sort: str = 'name', genre: str = None, year: str = None, user_id: int = None, after: str = None):
+    """Return one page of indexed items and the filtered total.
+
+    With sort='name', ``after`` may be the library_cursor() of the last item
+    of the previous page; the page then continues from that key instead of
+    skipping ``offset`` rows, which keeps deep pages cheap on large libraries.
+    A bare path (what earlier releases returned) still works while that row
+    exists; a cursor that cannot be resolved falls back to ``offset``.
+    """
     # Validation
     allowed_sorts = ['name', 'newest', 'oldest', 'year_desc', 'year_asc', 'recently_played', 'top_watched']
     if sort not in allowed_sorts:
         sort = 'name'
 
-    # Handle FastAPI Query objects if passed directly in tests
-    if hasattr(q, 'default'): q = q.default
-    if hasattr(genre, 'default'): genre = genre.default
-    if hasattr(year, 'default'): year = year.default
-    if hasattr(sort, 'default'): sort = sort.default
-    if hasattr(offset, 'default'): offset = offset.default
-    if hasattr(limit, 'default'): limit = limit.default
-
-    q = (str(q) if q is not None and not hasattr(q, 'default') else "").strip().lower()
+    # FastAPI Query objects are unwrapped by the routers (get_library), so
+    # arguments arrive as plain values
+    q = (str(q) if q is not None else "").strip().lower()
     offset = max(0, int(offset or 0))
     limit = max(1, min(int(limit or 50), 50000))
 
+    # Filters are shared by the page query and the empty-page count fallback
+    # Cheapest test first: SQLite checks the predicates it cannot answer from
+    # an index in the order written, so the LIKE fallback comes last and only
+    # sees rows the year and genre filters kept
+    where_sql = ' WHERE l.category = ?'
+    where_params = [category]
+
+    if year:
+        # Validate year is numeric to prevent injection
+        if year.isdigit():
+            where_sql += ' AND l.year = ?'
+            where_params.append(year)
+        else:
+            # Invalid year parameter - skip it
+            pass
+
+    if genre:
+        where_sql += ' AND l.path IN (SELECT path FROM library_genres WHERE category = ? AND genre = ?)'
+        where_params.extend([category, genre.strip()])
+
+    match = _fts_match_query(q) if q and _fts_enabled else None
+    if match:
+        # Token-prefix search through the full-text index
+        where_sql += ' AND l.rowid IN (SELECT rowid FROM library_fts WHERE library_fts MATCH ?)'
+        where_params.append(match)
+    elif q:
+        # Sanitize query to prevent SQL injection
+        safe_q = sanitize_like_pattern(q)
+        where_sql += ' AND (l.name_lc LIKE ? ESCAPE "\\" OR l.folder_lc LIKE ? ESCAPE "\\")'
+        where_params.extend([f"%{safe_q}%", f"%{safe_q}%"])
+
+    # Keyset cursor only applies to the name order, which is total thanks to
+    # the path tiebreaker; other sorts keep using OFFSET
+    if sort != 'name':
+        after = None
+
+    # Only the progress sorts need progress for every matching row; any other
+    # page is read from library_index alone and gets progress for its own rows
+    join_progress = user_id is not None and sort in ('recently_played', 'top_watched')
+    pending = _pending_progress(user_id) if join_progress else {}
+
     conn = get_db()
     try:
-        c = conn.cursor()
-        
-        # Base query joins with progress for sorting by last_played or play_count
-        # Base query joins with progress for sorting by last_played or play_count
-        # We always join or simulate progress to keep sorting logic consistent
-        if user_id is not None:
-            sql = '''
-                SELECT l.*, p.current_time, p.duration, p.play_count, p.last_played
+        cursor = None
+        if after:
+            cursor = _parse_library_cursor(after)
+            if cursor is None:
+                row = conn.execute('SELECT name_sort FROM library_index WHERE path = ?', (after,)).fetchone()
+                cursor = (row[0], after) if row else None
+            if cursor is None:
+                after = None
+
+        # COUNT(*) OVER () returns the filtered total alongside the page, so the
+        # filter is evaluated once instead of again in a separate COUNT query.
+        # A cursor narrows the rows the window sees, so it is skipped then.
+        total_col = '' if after else ', COUNT(*) OVER () AS _total'
+        if pending:
+            # Rank on the positions still waiting to be flushed too
+            sql = _SQL_PENDING_PROGRESS + f'''
+                SELECT {_LIBRARY_INDEX_COLUMNS}, {_PENDING_PROGRESS_COLUMNS}{total_col}
                 FROM library_index l
                 LEFT JOIN progress p ON l.path = p.path AND p.user_id = ?
-                WHERE l.category = ?
-            '''
-            params = [user_id, category]
+                LEFT JOIN pending b ON b.path = l.path
+            ''' + where_sql
+            params = [_pending_json(pending), user_id] + where_params
+        elif join_progress:
+            sql = f'''
+                SELECT {_LIBRARY_INDEX_COLUMNS}, {_STORED_PROGRESS_COLUMNS}{total_col}
+                FROM library_index l
+                LEFT JOIN progress p ON l.path = p.path AND p.user_id = ?
+            ''' + where_sql
+            params = [user_id] + where_params
         else:
-            sql = '''
-                SELECT l.*, p.current_time, p.duration, p.play_count, p.last_played
+            sql = f'''
+                SELECT {_LIBRARY_INDEX_COLUMNS}{total_col}
                 FROM library_index l
-                LEFT JOIN (SELECT NULL as path, NULL as current_time, NULL as duration, 0 as play_count, NULL as last_played) p ON 1=0
-                WHERE l.category = ?
-            '''
-            params = [category]
-        
-        if q:
-            # Sanitize query to prevent SQL injection
-            safe_q = sanitize_like_pattern(q)
-            sql += ' AND (LOWER(l.name) LIKE ? ESCAPE "\\" OR LOWER(l.folder) LIKE ? ESCAPE "\\")'
-            params.extend([f"%{safe_q}%", f"%{safe_q}%"])
-        
-        if genre:
-            # Sanitize genre to prevent SQL injection
-            safe_genre = sanitize_like_pattern(genre)
-            sql += ' AND l.genre LIKE ? ESCAPE "\\"'
-            params.append(f"%{safe_genre}%")
-            
-        if year:
-            # Validate year is numeric to prevent injection
-            if year.isdigit():
-                sql += ' AND l.year = ?'
-                params.append(year)
-            else:
-                # Invalid year parameter - skip it
-                pass
-            
+            ''' + where_sql
+            params = list(where_params)
+
+        if after:
+            sql += ' AND (l.name_sort, l.path) > (?, ?)'
+            params.extend(cursor)
+            offset = 0
+
         # Sorting
         if sort == 'name':
-            sql += ' ORDER BY l.name COLLATE NATSORT'
+            sql += ' ORDER BY l.name_sort, l.path'
         elif sort == 'newest':
             sql += ' ORDER BY l.mtime DESC'
         elif sort == 'oldest':
             sql += ' ORDER BY l.mtime ASC'
         elif sort == 'year_desc':
-            sql += ' ORDER BY l.year DESC, l.name COLLATE NATSORT'
+            sql += ' ORDER BY l.year DESC, l.name_sort'
         elif sort == 'year_asc':
-            sql += ' ORDER BY l.year ASC, l.name COLLATE NATSORT'
-        elif sort == 'recently_played':
-            sql += ' ORDER BY p.last_played DESC'
-        elif sort == 'top_watched':
-            sql += ' ORDER BY p.play_count DESC, l.name COLLATE NATSORT'
+            sql += ' ORDER BY l.year ASC, l.name_sort'
+        elif sort == 'recently_played' and join_progress:
+            # The result columns, which include any pending position
+            sql += ' ORDER BY last_played DESC'
+        elif sort == 'top_watched' and join_progress:
+            sql += ' ORDER BY play_count DESC, l.name_sort'
+        elif sort in ('recently_played', 'top_watched'):
+            # Nobody to rank progress for
+            sql += ' ORDER BY l.name_sort'
         else:
             # Default sort
             if category == 'movies':
-                sql += ' ORDER BY l.name COLLATE NATSORT'
+                sql += ' ORDER BY l.name_sort'
             else:
-                sql += ' ORDER BY l.folder COLLATE NATSORT, l.name COLLATE NATSORT'
+                sql += ' ORDER BY l.folder_sort, l.name_sort'
                 
         sql += ' LIMIT ? OFFSET ?'
         params.extend([limit, offset])
         
-        c.execute(sql, params)
-        rows = c.fetchall()
+        items = [dict(r) for r in conn.execute(sql, params)]
+        if items and not after:
+            total = items[0]["_total"]
+            for item in items:
+                del item["_total"]
+        elif offset > 0 or after:
+            # Keyset page, or paged past the end: no window total to read
+            row = conn.execute('SELECT COUNT(*) FROM library_index l' + where_sql, where_params).fetchone()
+            total = row[0]
+        else:
+            total = 0
 
-        # Get total count for pagination (reuse filter logic)
-        count_sql = 'SELECT COUNT(1) AS cnt FROM library_index l WHERE l.category = ?'
-        count_params = [category]
-        if q:
-            safe_q = sanitize_like_pattern(q)
-            count_sql += ' AND (LOWER(l.name) LIKE ? ESCAPE "\\" OR LOWER(l.folder) LIKE ? ESCAPE "\\")'
-            count_params.extend([f"%{safe_q}%", f"%{safe_q}%"])
-        if genre:
-            safe_genre = sanitize_like_pattern(genre)
-            count_sql += ' AND l.genre LIKE ? ESCAPE "\\"'
-            count_params.append(f"%{safe_genre}%")
-        if year:
-            if year.isdigit():
-                count_sql += ' AND l.year = ?'
-                count_params.append(year)
-            
-        c.execute(count_sql, count_params)
-        total = int(c.fetchone()["cnt"])
+        if not join_progress:
+            progress = get_progress_many(user_id, [item["path"] for item in items]) if user_id is not None else {}
+            for item in items:
+                p = progress.get(item["path"])
+                item["current_time"] = p["current_time"] if p else None
+                item["duration"] = p["duration"] if p else None
+                item["play_count"] = p["play_count"] if p else (None if user_id is not None else 0)
+                item["last_played"] = p["last_played"] if p else None
 
-        return [dict(r) for r in rows], total
+        return items, total
     finally:
         return_db(conn)
 
-def query_shows(q: str = None, offset: int = 0, limit: int = 50, sort: str = 'name', genre: str = None, year: str = None, user_id: int = None):
-    # Handle FastAPI Query objects if passed directly in tests
-    if hasattr(q, 'default'): q = q.default
-    if hasattr(genre, 'default'): genre = genre.default
-    if hasattr(year, 'default'): year = year.default
-    if hasattr(sort, 'default'): sort = sort.default
-    if hasattr(offset, 'default'): offset = offset.default
-    if hasattr(limit, 'default'): limit = limit.default
+def search_library(q: str, limit: int = 40) -> List[dict]:
+    """Items in any category whose name or metadata title matches ``q``.
 
+    Names are matched through the full-text index (LIKE when FTS5 is
+    missing). Titles live in file_metadata, outside library_fts, so they are
+    still matched with LIKE, but only over file_metadata rather than over
+    every library row joined to it.
+    """
+    safe_q = f"%{sanitize_like_pattern(q)}%"
+    match = _fts_match_query(q, column="name") if _fts_enabled else None
+    if match:
+        name_sql = 'SELECT rowid FROM library_fts WHERE library_fts MATCH ?'
+        params = [match]
+    else:
+        name_sql = 'SELECT rowid FROM library_index WHERE name LIKE ? ESCAPE "\\"'
+        params = [safe_q]
+    params.extend([safe_q, safe_q, int(limit)])
+    conn = get_db()
+    try:
+        rows = conn.execute(f'''
+            SELECT li.path, li.category, li.name, li.folder, li.year,
+                   COALESCE(fm.custom_title, fm.title, li.name) AS title,
+                   COALESCE(fm.custom_poster, fm.poster, li.poster) AS poster
+            FROM library_index li
+            LEFT JOIN file_metadata fm ON fm.path = li.path
+            WHERE li.rowid IN (
+                {name_sql}
+                UNION
+                SELECT l.rowid FROM file_metadata m JOIN library_index l ON l.path = m.path
+                WHERE m.title LIKE ? ESCAPE "\\" OR m.custom_title LIKE ? ESCAPE "\\"
+            )
+            ORDER BY li.name_sort
+            LIMIT ?
+        ''', params)
+        return [dict(r) for r in rows]
+    finally:
+        return_db(conn)
+
+# Progress rolled up per show, for the shows of one page (a JSON array)
+_SQL_SHOWS_PROGRESS = '''
+    SELECT l.show_name, MAX(p.last_played) as last_played, SUM(COALESCE(p.play_count, 0)) as total_plays
+    FROM library_index l
+    JOIN progress p ON p.path = l.path AND p.user_id = ?
+    WHERE l.category = 'shows' AND l.show_name IN (SELECT value FROM json_each(?))
+    GROUP BY l.show_name
+'''
+# The same with pending positions (see _SQL_PENDING_PROGRESS): an episode
+# counts if it has a stored row, a pending one, or both
+_SQL_SHOWS_PENDING_PROGRESS = _SQL_PENDING_PROGRESS + f'''
+    SELECT l.show_name, MAX({_PENDING_LAST_PLAYED}) as last_played, SUM(COALESCE(p.play_count, 0)) as total_plays
+    FROM library_index l
+    LEFT JOIN progress p ON p.path = l.path AND p.user_id = ?
+    LEFT JOIN pending b ON b.path = l.path
+    WHERE l.category = 'shows' AND l.show_name IN (SELECT value FROM json_each(?))
+      AND (p.path IS NOT NULL OR b.path IS NOT NULL)
+    GROUP BY l.show_name
+'''
+
+# Show pages are grouped over every episode, and a search box re-issues the
+# same (q, page) as the user types, so pages are kept for CACHE_TTL_SECONDS.
+# An entry only counts while _write_generation is unchanged: any write to the
+# database, not just the library, retires it. A user with positions pending
+# flush bypasses the cache until the flush, which bumps the generation.
+_SHOWS_CACHE_MAX = 256
+_shows_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_shows_lock = threading.Lock()
+
+def query_shows(q: str = None, offset: int = 0, limit: int = 50, sort: str = 'name', genre: str = None, year: str = None, user_id: int = None):
+    pending = _pending_progress(user_id) if user_id is not None else {}
+    if pending:
+        return _query_shows(q, offset, limit, sort, genre, year, user_id, pending)
+    key = (q, offset, limit, sort, genre, year, user_id)
+    with _shows_lock:
+        cached = _shows_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic() and cached[1] == _write_generation:
+            _shows_cache.move_to_end(key)
+            # Callers get their own copies to modify
+            return [dict(item) for item in cached[2]], cached[3]
+        generation = _write_generation
+    items, total = _query_shows(q, offset, limit, sort, genre, year, user_id, pending)
+    with _shows_lock:
+        if generation == _write_generation:
+            _shows_cache[key] = (time.monotonic() + CACHE_TTL_SECONDS, generation,
+                                 [dict(item) for item in items], total)
+            _shows_cache.move_to_end(key)
+            if len(_shows_cache) > _SHOWS_CACHE_MAX:
+                _shows_cache.popitem(last=False)
+    return items, total
+
+def _query_shows(q, offset, limit, sort, genre, year, user_id, pending):
     # Validation
     allowed_sorts = ['name', 'newest', 'top_watched', 'recently_played']
     if sort not in allowed_sorts:
         sort = 'name'
 
+    # As in query_library_index, only the progress sorts join progress for
+    # every episode; other pages add it for their own shows afterwards
+    join_progress = user_id is not None and sort in ('recently_played', 'top_watched')
+
     conn = get_db()
     try:
         c = conn.cursor()
         
-        # Subquery to extract show name and include relevant columns
-        if user_id is not None:
-            sql_base = '''
-                FROM (
-                    SELECT 
-                        CASE 
-                            WHEN INSTR(folder, '/') > 0 THEN SUBSTR(folder, 1, INSTR(folder, '/') - 1)
-                            WHEN folder != '.' AND folder NOT LIKE '%/%' THEN folder
-                            WHEN folder = '.' THEN 
-                                CASE 
-                                    WHEN name LIKE '%.%' THEN SUBSTR(name, 1, INSTR(name, '.') - 1)
-                                    ELSE name
-                                END
-                            ELSE folder 
-                        END as show_name,
-                        folder, path, poster, mtime, genre, year
-                    FROM library_index
-                    WHERE category = 'shows'
-                ) l
-                LEFT JOIN progress p ON l.path = p.path AND p.user_id = ?
-            '''
+        # show_name is stored per row, so grouping walks idx_library_category_show.
+        # With a genre filter the rows are found from that genre's
+        # library_genres entries instead (one per file, so counts are
+        # unchanged): that beats probing every episode's path against the
+        # genre's path list.
+        if genre:
+            sql_base = "FROM library_genres g JOIN library_index l ON l.path = g.path"
+        else:
+            sql_base = "FROM library_index l"
+        # Prefixed to the statements that join progress
+        with_sql = ""
+        if join_progress:
+            sql_base += " LEFT JOIN progress p ON l.path = p.path AND p.user_id = ?"
+            last_played = "MAX(p.last_played)"
             params = [user_id]
+            if pending:
+                with_sql = _SQL_PENDING_PROGRESS
+                sql_base += " LEFT JOIN pending b ON b.path = l.path"
+                last_played = f"MAX({_PENDING_LAST_PLAYED})"
+                params = [_pending_json(pending), user_id]
+            progress_cols = f'''
+                {last_played} as last_played,
+                SUM(COALESCE(p.play_count, 0)) as total_plays,'''
         else:
-            sql_base = '''
-                FROM (
-                    SELECT 
-                        CASE 
-                            WHEN INSTR(folder, '/') > 0 THEN SUBSTR(folder, 1, INSTR(folder, '/') - 1)
-                            WHEN folder != '.' AND folder NOT LIKE '%/%' THEN folder
-                            WHEN folder = '.' THEN 
-                                CASE 
-                                    WHEN name LIKE '%.%' THEN SUBSTR(name, 1, INSTR(name, '.') - 1)
-                                    ELSE name
-                                END
-                            ELSE folder 
-                        END as show_name,
-                        folder, path, poster, mtime, genre, year
-                    FROM library_index
-                    WHERE category = 'shows'
-                ) l
-                LEFT JOIN (SELECT NULL as path, NULL as last_played, 0 as play_count) p ON 1=0
-            '''
+            progress_cols = '''
+                NULL as last_played,
+                0 as total_plays,'''
             params = []
-        
-        where_clauses = []
-        
-        if q:
-            safe_q = sanitize_like_pattern(q)
-            where_clauses.append('l.show_name LIKE ? ESCAPE "\\"')
-            params.append(f"%{safe_q}%")
-        
-        if genre:
-            safe_genre = sanitize_like_pattern(genre)
-            where_clauses.append('l.genre LIKE ? ESCAPE "\\"')
-            params.append(f"%{safe_genre}%")
-            
+
+        # Equality first and the text match last, as in query_library_index
+        where_clauses = ["l.category = 'shows'"]
+
         if year:
             if year.isdigit():
                 where_clauses.append('l.year = ?')
                 params.append(year)
+
+        if genre:
+            where_clauses.append("g.category = 'shows' AND g.genre = ?")
+            params.append(genre.strip())
+
+        # The text match below only looks at show_name, so it selects whole
+        # shows; the filters so far select episodes within them
+        row_where_sql = " WHERE " + " AND ".join(where_clauses)
+        row_params = list(params)
+
+        match = _fts_match_query(q, column="show_name") if q and _fts_enabled else None
+        if match:
+            where_clauses.append('l.rowid IN (SELECT rowid FROM library_fts WHERE library_fts MATCH ?)')
+            params.append(match)
+        elif q:
+            safe_q = sanitize_like_pattern(q)
+            where_clauses.append('l.show_name LIKE ? ESCAPE "\\"')
+            params.append(f"%{safe_q}%")
             
         where_sql = ""
         if where_clauses:
             where_sql = " WHERE " + " AND ".join(where_clauses)
             
-        # Grouping query
-        group_sql = f'''
-            SELECT 
-                show_name as name,
+        # Per-show aggregates
+        group_cols = f'''
+                l.show_name as name,
                 MAX(l.poster) as poster,
-                MAX(l.mtime) as mtime,
-                MAX(p.last_played) as last_played,
+                MAX(l.mtime) as mtime,{progress_cols}
                 COUNT(*) as episode_count,
-                SUM(COALESCE(p.play_count, 0)) as total_plays,
                 GROUP_CONCAT(DISTINCT l.genre) as genres,
-                MIN(l.year) as year
-            {sql_base}
-            {where_sql}
-            GROUP BY show_name
-        '''
-        
-        # Get total count for pagination
-        count_sql = f"SELECT COUNT(DISTINCT show_name) {sql_base} {where_sql}"
-        c.execute(count_sql, params)
-        total = c.fetchone()[0]
-        
-        # Sorting
-        order_by = "name COLLATE NATSORT ASC"
-        if sort == 'newest':
-            order_by = "mtime DESC"
-        elif sort == 'top_watched':
-            order_by = "total_plays DESC, episode_count DESC"
-        elif sort == 'recently_played':
-            order_by = "last_played DESC"
-            
-        final_sql = f"{group_sql} ORDER BY {order_by} LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        
-        c.execute(final_sql, params)
-        rows = c.fetchall()
-        
+                MIN(l.year) as year'''
         items = []
-        for r in rows:
-            item = dict(r)
-            # Clean up genres
+        total = 0
+
+        if join_progress:
+            # The progress sorts order by the aggregates themselves, so every
+            # show is aggregated. The window runs after grouping, so _total is
+            # the number of shows matching the filter: the page and the total
+            # come from one query.
+            if sort == 'top_watched':
+                order_by = "total_plays DESC, episode_count DESC"
+            else:
+                order_by = "last_played DESC"
+            c.execute(f'''{with_sql}
+                SELECT {group_cols},
+                    COUNT(*) OVER () as _total
+                {sql_base}
+                {where_sql}
+                GROUP BY l.show_name
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            for r in c:
+                item = dict(r)
+                total = item.pop('_total')
+                items.append(item)
+        else:
+            # Name and newest pages pick the page's shows from the show names
+            # alone (name order streams off idx_library_category_show_sort, as
+            # every row of a show has the same show_sort), then aggregate just
+            # those shows instead of every show in the library. Their names
+            # already passed the text match, which is not repeated.
+            if sort == 'newest':
+                page_sql = f"SELECT l.show_name, COUNT(*) OVER () {sql_base} {where_sql} GROUP BY l.show_name ORDER BY MAX(l.mtime) DESC"
+            else:
+                page_sql = f"SELECT l.show_name, COUNT(*) OVER () {sql_base} {where_sql} GROUP BY l.show_sort, l.show_name ORDER BY l.show_sort, l.show_name"
+            c.execute(f"{page_sql} LIMIT ? OFFSET ?", params + [limit, offset])
+            page = c.fetchall()
+            if page:
+                total = page[0][1]
+                names = [r[0] for r in page]
+                # One JSON array rather than a ? per show, as in get_progress_many
+                c.execute(f'''
+                    SELECT {group_cols}
+                    {sql_base}
+                    {row_where_sql} AND l.show_name IN (SELECT value FROM json_each(?))
+                    GROUP BY l.show_name
+                ''', row_params + [json.dumps(names)])
+                by_name = {r["name"]: dict(r) for r in c}
+                items = [by_name[name] for name in names if name in by_name]
+
+        for item in items:
+            # GROUP_CONCAT joins the distinct genre strings with ',', the same
+            # separator they use inside, so one split yields single genres
             if item.get('genres'):
-                gs = set()
-                for g_str in item['genres'].split(','):
-                    gs.update([p.strip() for p in g_str.split(',')])
-                item['genres'] = sorted(list(gs))
-            items.append(item)
+                item['genres'] = sorted(set(split_genres(item['genres'])))
+
+        if not items and offset:
+            # Paged past the end: the window had no rows to report a total on
+            c.execute(f"{with_sql} SELECT COUNT(DISTINCT l.show_name) {sql_base} {where_sql}", params)
+            total = c.fetchone()[0]
+
+        if items and user_id is not None and not join_progress:
+            names = json.dumps([item["name"] for item in items])
+            if pending:
+                c.execute(_SQL_SHOWS_PENDING_PROGRESS, (_pending_json(pending), user_id, names))
+            else:
+                c.execute(_SQL_SHOWS_PROGRESS, (user_id, names))
+            watched = {r["show_name"]: r for r in c}
+            for item in items:
+                r = watched.get(item["name"])
+                if r:
+                    item["last_played"] = r["last_played"]
+                    item["total_plays"] = r["total_plays"]
             
         return items, total
     finally:
         return_db(conn)
 
+# Per-user tables that point at media by path; a rename moves their rows along
+# (a row the user already has for the new path is kept instead)
+_PATH_REFERENCE_TABLES = ("watchlist", "ratings", "playlist_items")
+
 def rename_media_path(old_path: str, new_path: str, is_dir: bool = False):
     if not old_path or not new_path or old_path == new_path:
         return
     
-    conn = get_db()
+    flush_progress()
+    conn = get_write_db()
     try:
+        # One write transaction for every table touched by the rename, taken
+        # up front so a concurrent writer cannot interleave between UPDATEs
+        _begin(conn, immediate=True)
         c = conn.cursor()
         
         if is_dir:
-            # Update directory path and all children
-            # format: /data/category/folder/...
-            c.execute('UPDATE progress SET path = ? || SUBSTR(path, ?) WHERE path LIKE ? || "/%"', (new_path, len(old_path) + 1, old_path))
-            c.execute('UPDATE file_metadata SET path = ? || SUBSTR(path, ?) WHERE path LIKE ? || "/%"', (new_path, len(old_path) + 1, old_path))
-            
-            # For library_index, we need to update 'path' and 'folder' columns
-            # First, find the category and old folder prefix
-            # old_path looks like /data/category/old_folder_prefix
-            path_parts = old_path.split('/')
-            if len(path_parts) >= 3:
-                category = path_parts[2]
-                # old_folder is relative to /data/category/
-                old_folder_prefix = "/".join(path_parts[3:])
-                
-                new_path_parts = new_path.split('/')
-                new_folder_prefix = "/".join(new_path_parts[3:])
-                
-                if old_folder_prefix:
-                    # Update folder column for children
-                    # If folder was 'ShowName/Season 1' and we rename 'ShowName' to 'NewShowName'
-                    # folder should become 'NewShowName/Season 1'
-                    c.execute('''
-                        UPDATE library_index 
-                        SET folder = ? || SUBSTR(folder, ?) 
-                        WHERE category = ? AND (folder = ? OR folder LIKE ? || "/%")
-                    ''', (new_folder_prefix, len(old_folder_prefix) + 1, category, old_folder_prefix, old_folder_prefix))
-                    
-                    # Update name if the directory itself is indexed (rare but possible)
-                    c.execute('UPDATE library_index SET name = ? WHERE path = ?', (new_path_parts[-1], old_path))
-
-            c.execute('UPDATE library_index SET path = ? || SUBSTR(path, ?) WHERE path LIKE ? || "/%"', (new_path, len(old_path) + 1, old_path))
-            
-            # Also update the directory itself if it exists in the index
-            c.execute('UPDATE library_index SET path = ? WHERE path = ?', (new_path, old_path))
+            # Update the directory and everything below it. Children are found
+            # with a path range ('0' sorts right after '/') instead of LIKE, which
+            # would treat % and _ in names as wildcards, ignore case, and could
+            # not use the path indexes.
+            lo, hi = old_path + '/', old_path + '0'
+            cut = len(old_path) + 1
+            c.execute('UPDATE progress SET path = ? || SUBSTR(path, ?) WHERE path > ? AND path < ?', (new_path, cut, lo, hi))
+            c.execute('UPDATE file_metadata SET path = ? || SUBSTR(path, ?) WHERE path > ? AND path < ?', (new_path, cut, lo, hi))
+            for table in _PATH_REFERENCE_TABLES:
+                c.execute(f'UPDATE OR IGNORE {table} SET path = ? || SUBSTR(path, ?) WHERE path = ? OR (path > ? AND path < ?)',
+                          (new_path, cut, old_path, lo, hi))
+
+            # library_index also keeps the folder relative to /data/<category>/:
+            # renaming 'ShowName' turns folder 'ShowName/Season 1' into
+            # 'NewShowName/Season 1'. A single pass rewrites path, folder and
+            # the name of the directory's own row (rare but possible).
+            old_folder = "/".join(old_path.split('/')[3:])
+            new_folder = "/".join(new_path.split('/')[3:])
+            new_name = new_path.split('/')[-1]
+            c.execute('''
+                UPDATE library_index SET
+                    path = :new_path || SUBSTR(path, :cut),
+                    folder = CASE WHEN :old_folder != '' AND (folder = :old_folder OR (folder > :folder_lo AND folder < :folder_hi))
+                                  THEN :new_folder || SUBSTR(folder, :folder_cut) ELSE folder END,
+                    folder_lc = CASE WHEN :old_folder != '' AND (folder = :old_folder OR (folder > :folder_lo AND folder < :folder_hi))
+                                     THEN :new_folder_lc || SUBSTR(folder_lc, :folder_lc_cut) ELSE folder_lc END,
+                    folder_sort = CASE WHEN :old_folder != '' AND (folder = :old_folder OR (folder > :folder_lo AND folder < :folder_hi))
+                                       THEN :new_folder_sort || SUBSTR(folder_sort, :folder_sort_cut) ELSE folder_sort END,
+                    name = CASE WHEN path = :old_path THEN :new_name ELSE name END,
+                    name_lc = CASE WHEN path = :old_path THEN :new_name_lc ELSE name_lc END,
+                    name_sort = CASE WHEN path = :old_path THEN :new_name_sort ELSE name_sort END
+                WHERE path = :old_path OR (path > :lo AND path < :hi)
+            ''', {
+                "old_path": old_path, "new_path": new_path, "cut": cut, "lo": lo, "hi": hi,
+                "old_folder": old_folder, "folder_lo": old_folder + '/', "folder_hi": old_folder + '0',
+                "new_folder": new_folder, "folder_cut": len(old_folder) + 1,
+                "new_folder_lc": new_folder.lower(), "folder_lc_cut": len(old_folder.lower()) + 1,
+                "new_folder_sort": natural_sort_key_text(new_folder),
+                "folder_sort_cut": len(natural_sort_key_text(old_folder)) + 1,
+                "new_name": new_name, "new_name_lc": new_name.lower(), "new_name_sort": natural_sort_key_text(new_name),
+            })
+            # Renaming a show folder regroups its episodes; only the moved
+            # shows rows can be affected
+            c.execute('''
+                SELECT path, name, folder, show_name FROM library_index
+                WHERE category = 'shows' AND (path = ? OR (path > ? AND path < ?))
+            ''', (new_path, new_path + '/', new_path + '0'))
+            regrouped = [(show, natural_sort_key_text(show), r["path"]) for r in c.fetchall()
+                         if (show := library_show_name(r["name"], r["folder"])) != r["show_name"]]
+            if regrouped:
+                c.executemany("UPDATE library_index SET show_name = ?, show_sort = ? WHERE path = ?", regrouped)
         else:
             # Single file rename
             parts = new_path.split('/')
@@ -1173,78 +2546,166 @@ def rename_media_path(old_path: str, new_path: str, is_dir: bool = False):
                 new_folder = "/".join(parts[3:-1])
             if not new_folder:
                 new_folder = "."
+            new_show = library_show_name(new_name, new_folder)
 
             c.execute('UPDATE progress SET path = ? WHERE path = ?', (new_path, old_path))
             c.execute('UPDATE file_metadata SET path = ? WHERE path = ?', (new_path, old_path))
-            c.execute('UPDATE library_index SET path = ?, name = ?, folder = ? WHERE path = ?', (new_path, new_name, new_folder, old_path))
+            for table in _PATH_REFERENCE_TABLES:
+                c.execute(f'UPDATE OR IGNORE {table} SET path = ? WHERE path = ?', (new_path, old_path))
+            c.execute('''
+                UPDATE library_index
+                SET path = ?, name = ?, folder = ?, name_lc = ?, folder_lc = ?, name_sort = ?, folder_sort = ?,
+                    show_name = CASE WHEN category = 'shows' THEN ? END,
+                    show_sort = CASE WHEN category = 'shows' THEN ? END
+                WHERE path = ?
+            ''', (new_path, new_name, new_folder, new_name.lower(), new_folder.lower(),
+                  natural_sort_key_text(new_name), natural_sort_key_text(new_folder),
+                  new_show, natural_sort_key_text(new_show), old_path))
         
-        conn.commit()
+        _commit(conn)
+    except Exception:
+        _rollback(conn)
+        raise
     finally:
         return_db(conn)
 
 SESSION_MAX_AGE_DAYS = int(os.environ.get("SESSION_MAX_AGE_DAYS", 30))
 
+_SQL_CREATE_SESSION = 'INSERT INTO sessions (token, user_id) VALUES (?, ?)'
+_SQL_DELETE_SESSION = 'DELETE FROM sessions WHERE token = ?'
+_SQL_DELETE_USER_SESSIONS = 'DELETE FROM sessions WHERE user_id = ?'
+
 def create_session(token: str, user_id: int):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
-        c.execute('INSERT INTO sessions (token, user_id) VALUES (?, ?)', (token, user_id))
-        conn.commit()
+        c.execute(_SQL_CREATE_SESSION, (token, user_id))
+        _commit(conn)
     finally:
         return_db(conn)
 
+def _session_cutoff() -> str:
+    """Oldest still-valid created_at, in CURRENT_TIMESTAMP's UTC text format."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=SESSION_MAX_AGE_DAYS)
+    return cutoff.strftime('%Y-%m-%d %H:%M:%S')
+
+# Only return session if it hasn't expired
+_SQL_GET_SESSION = '''
+    SELECT token, user_id, created_at
+    FROM sessions
+    WHERE token = ? AND created_at >= ?
+'''
+
+# get_session runs for every API call and for every range request a player
+# makes under /data/, so valid sessions are kept in a small LRU for
+# SESSION_CACHE_SECONDS, or until the session's own max_age runs out if that
+# comes first. Unknown tokens are not cached. The writers below drop what
+# they delete and bump the generation, as for settings.
+SESSION_CACHE_SECONDS = 60.0
+_SESSION_CACHE_MAX = 4096
+_session_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_session_generation = 0
+_session_lock = threading.Lock()
+
+def _clear_session_cache(token: str = None):
+    """Forget one cached session, or all of them."""
+    global _session_generation
+    with _session_lock:
+        if token is None:
+            _session_cache.clear()
+        else:
+            _session_cache.pop(token, None)
+        _session_generation += 1
+
+def _session_cache_seconds(created_at) -> float:
+    """How long a session just read from the database may stay cached."""
+    try:
+        created = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return SESSION_CACHE_SECONDS
+    expires = created + timedelta(days=SESSION_MAX_AGE_DAYS)
+    return min(SESSION_CACHE_SECONDS, (expires - datetime.now(timezone.utc)).total_seconds())
+
 def get_session(token: str) -> Optional[dict]:
+    with _session_lock:
+        cached = _session_cache.get(token)
+        if cached is not None and cached[0] > time.monotonic():
+            _session_cache.move_to_end(token)
+            return dict(cached[1])
+        generation = _session_generation
     conn = get_db()
     try:
-        c = conn.cursor()
-        # Only return session if it hasn't expired
-        c.execute('''
-            SELECT token, user_id, created_at 
-            FROM sessions 
-            WHERE token = ? AND created_at >= datetime('now', '-' || ? || ' days')
-        ''', (token, SESSION_MAX_AGE_DAYS))
-        row = c.fetchone()
-        
-        if not row:
-            return None
-            
-        return dict(row)
+        row = conn.execute(_SQL_GET_SESSION, (token, _session_cutoff())).fetchone()
+    finally:
+        return_db(conn)
+    if not row:
+        return None
+    session = dict(row)
+    ttl = _session_cache_seconds(session["created_at"])
+    with _session_lock:
+        if generation == _session_generation and ttl > 0:
+            _session_cache[token] = (time.monotonic() + ttl, dict(session))
+            _session_cache.move_to_end(token)
+            if len(_session_cache) > _SESSION_CACHE_MAX:
+                _session_cache.popitem(last=False)
+    return session
+
+_SQL_GET_SESSION_USER = '''
+    SELECT u.*
+    FROM sessions s
+    JOIN users u ON u.id = s.user_id
+    WHERE s.token = ? AND s.created_at >= ?
+'''
+
+def get_session_user(token: str) -> Optional[dict]:
+    """The user behind a valid session, in one lookup instead of two."""
+    conn = get_db()
+    try:
+        row = conn.execute(_SQL_GET_SESSION_USER, (token, _session_cutoff())).fetchone()
+        return dict(row) if row else None
     finally:
         return_db(conn)
 
 def delete_session(token: str):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
-        c.execute('DELETE FROM sessions WHERE token = ?', (token,))
-        conn.commit()
+        c.execute(_SQL_DELETE_SESSION, (token,))
+        _commit(conn)
     finally:
         return_db(conn)
+        _clear_session_cache(token)
 
 def delete_user_sessions(user_id: int):
     """Delete all sessions for a user (used during session rotation on login)."""
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
-        c.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
-        conn.commit()
+        c.execute(_SQL_DELETE_USER_SESSIONS, (user_id,))
+        _commit(conn)
     finally:
         return_db(conn)
+        # The cache is keyed by token; rotation is rare, so drop it all
+        _clear_session_cache()
 
 def cleanup_sessions():
     """Remove sessions older than the configured max_age."""
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
-        c.execute('''
-            DELETE FROM sessions
-            WHERE created_at < datetime('now', '-' || ? || ' days')
-        ''', (SESSION_MAX_AGE_DAYS,))
-        conn.commit()
+        # Plain range on idx_sessions_created
+        c.execute('DELETE FROM sessions WHERE created_at < ?', (_session_cutoff(),))
+        _commit(conn)
+        # Return up to 1000 free pages (sessions, cache and index churn) to the
+        # filesystem. Run as a script: execute() would only free a single page.
+        # executescript() commits first, so never inside a bulk() block.
+        if not _in_bulk():
+            conn.executescript("PRAGMA incremental_vacuum(1000)")
     except Exception as e:
         logging.getLogger(__name__).error(f"Error cleaning up sessions: {e}")
     finally:
         return_db(conn)
+        _clear_session_cache()
 
 # OMDb Cache Functions
 OMDB_CACHE_DAYS = 30
@@ -1260,20 +2721,25 @@ def get_omdb_cache(cache_key: str) -> Optional[dict]:
             WHERE cache_key = ? AND expires_at > datetime('now')
         ''', (cache_key,))
         row = c.fetchone()
-        if row:
-            try:
-                return json.loads(row[0])
-            except (json.JSONDecodeError, TypeError, ValueError):
-                # Invalid cached data, delete it
-                c.execute('DELETE FROM omdb_cache WHERE cache_key = ?', (cache_key,))
-                conn.commit()
-        return None
     finally:
         return_db(conn)
+    if not row:
+        return None
+    try:
+        return _json_loads(row[0])
+    except (json.JSONDecodeError, TypeError, ValueError):
+        # Invalid cached data, delete it
+        conn = get_write_db()
+        try:
+            conn.execute('DELETE FROM omdb_cache WHERE cache_key = ?', (cache_key,))
+            _commit(conn)
+        finally:
+            return_db(conn)
+    return None
 
 def set_omdb_cache(cache_key: str, response_data: dict):
     """Cache an OMDb API response."""
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('''
@@ -1283,118 +2749,111 @@ def set_omdb_cache(cache_key: str, response_data: dict):
                 response_data = excluded.response_data,
                 cached_at = excluded.cached_at,
                 expires_at = excluded.expires_at
-        ''', (cache_key, json.dumps(response_data), OMDB_CACHE_DAYS))
-        conn.commit()
+        ''', (cache_key, _json_dumps(response_data), OMDB_CACHE_DAYS))
+        _commit(conn)
     finally:
         return_db(conn)
 
 def cleanup_expired_omdb_cache():
     """Remove expired OMDb cache entries."""
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute("DELETE FROM omdb_cache WHERE expires_at < datetime('now')")
-        conn.commit()
+        _commit(conn)
     except Exception as e:
         logging.getLogger(__name__).error(f"Error cleaning up OMDb cache: {e}")
     finally:
         return_db(conn)
 
-def get_recently_watched(user_id: int, limit: int = 20) -> List[Dict]:
-    """Get recently watched items for a user, ordered by last_played."""
+_SQL_WATCHED_COLUMNS = '''
+    p.current_time, p.duration, p.play_count, p.last_played,
+    fm.title, fm.year, fm.poster, fm.media_type, fm.plot, fm.rated, fm.genre'''
+# Stored rows for the paths with pending positions (or none yet), to overlay
+_SQL_WATCHED_PENDING = f'''
+    SELECT b.value AS path, {_SQL_WATCHED_COLUMNS}, p.path IS NOT NULL AS _stored
+    FROM json_each(?) b
+    LEFT JOIN progress p ON p.user_id = ? AND p.path = b.value
+    LEFT JOIN file_metadata fm ON fm.path = b.value
+'''
+
+def _watched_items(user_id: int, where: str, order_by: str, limit: int, keep, sort_key) -> List[Dict]:
+    """A user's progress rows with their metadata, filtered and ordered in SQL.
+
+    Paths with pending positions are left out of that query and read on
+    their own, with the positions applied; ``keep`` and ``sort_key`` then
+    redo ``where`` and ``order_by`` for them in Python.
+    """
+    pending = _pending_progress(user_id)
+    sql = f'''
+        SELECT p.path, {_SQL_WATCHED_COLUMNS}
+        FROM progress p
+        LEFT JOIN file_metadata fm ON p.path = fm.path
+        WHERE p.user_id = ? AND {where}'''
     conn = get_db()
     try:
-        c = conn.cursor()
-        c.execute('''
-            SELECT p.path, p.current_time, p.duration, p.play_count, p.last_played,
-                   fm.title, fm.year, fm.poster, fm.media_type, fm.plot, fm.rated, fm.genre
-            FROM progress p
-            LEFT JOIN file_metadata fm ON p.path = fm.path
-            WHERE p.user_id = ? AND p.last_played IS NOT NULL
-            ORDER BY p.last_played DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        rows = c.fetchall()
-        results = []
-        for row in rows:
-            item = {
-                'path': row[0],
-                'current_time': row[1],
-                'duration': row[2],
-                'play_count': row[3],
-                'last_played': row[4],
-                'title': row[5],
-                'year': row[6],
-                'poster': row[7],
-                'media_type': row[8],
-                'plot': row[9],
-                'rated': row[10],
-                'genre': row[11]
-            }
-            # Calculate progress percentage
-            if item['duration'] and item['duration'] > 0:
-                item['progress_percent'] = int((item['current_time'] / item['duration']) * 100)
+        if not pending:
+            return [dict(row) for row in conn.execute(f"{sql} ORDER BY {order_by} LIMIT ?", (user_id, limit))]
+        paths = json.dumps(list(pending))
+        items = [dict(row) for row in conn.execute(
+            f"{sql} AND p.path NOT IN (SELECT value FROM json_each(?)) ORDER BY {order_by} LIMIT ?",
+            (user_id, paths, limit))]
+        for row in conn.execute(_SQL_WATCHED_PENDING, (paths, user_id)):
+            item = dict(row)
+            value = pending[item["path"]]
+            if item.pop("_stored"):
+                _apply_pending(item, value)
             else:
-                item['progress_percent'] = 0
-            results.append(item)
-        return results
+                item.update(_apply_pending(None, value), play_count=0)
+            if keep(item):
+                items.append(item)
     finally:
         return_db(conn)
+    items.sort(key=sort_key, reverse=True)
+    return items[:limit]
+
+def get_recently_watched(user_id: int, limit: int = 20) -> List[Dict]:
+    """Get recently watched items for a user, ordered by last_played."""
+    results = _watched_items(
+        user_id, "p.last_played IS NOT NULL", "p.last_played DESC", limit,
+        keep=lambda item: item["last_played"] is not None,
+        sort_key=lambda item: item["last_played"],
+    )
+    for item in results:
+        # Calculate progress percentage
+        if item['duration'] and item['duration'] > 0:
+            item['progress_percent'] = int((item['current_time'] / item['duration']) * 100)
+        else:
+            item['progress_percent'] = 0
+    return results
 
 def get_most_watched(user_id: int, limit: int = 20) -> List[Dict]:
     """Get most watched items for a user, ordered by play_count."""
-    conn = get_db()
-    try:
-        c = conn.cursor()
-        c.execute('''
-            SELECT p.path, p.current_time, p.duration, p.play_count, p.last_played,
-                   fm.title, fm.year, fm.poster, fm.media_type, fm.plot, fm.rated, fm.genre
-            FROM progress p
-            LEFT JOIN file_metadata fm ON p.path = fm.path
-            WHERE p.user_id = ? AND p.play_count > 0
-            ORDER BY p.play_count DESC, p.last_played DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        rows = c.fetchall()
-        results = []
-        for row in rows:
-            results.append({
-                'path': row[0],
-                'current_time': row[1],
-                'duration': row[2],
-                'play_count': row[3],
-                'last_played': row[4],
-                'title': row[5],
-                'year': row[6],
-                'poster': row[7],
-                'media_type': row[8],
-                'plot': row[9],
-                'rated': row[10],
-                'genre': row[11]
-            })
-        return results
-    finally:
-        return_db(conn)
+    return _watched_items(
+        user_id, "p.play_count > 0", "p.play_count DESC, p.last_played DESC", limit,
+        keep=lambda item: (item["play_count"] or 0) > 0,
+        sort_key=lambda item: (item["play_count"], item["last_played"] or ""),
+    )
 
 # ── Watchlist ────────────────────────────────────────────────────────────────
 def add_to_watchlist(user_id: int, path: str, category: str, title: str, poster: str = None):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute(
             'INSERT OR IGNORE INTO watchlist (user_id, path, category, title, poster) VALUES (?,?,?,?,?)',
             (user_id, path, category or '', title or '', poster or '')
         )
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
 def remove_from_watchlist(user_id: int, path: str):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('DELETE FROM watchlist WHERE user_id=? AND path=?', (user_id, path))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -1406,7 +2865,7 @@ def get_watchlist(user_id: int) -> List[Dict]:
             'SELECT path, category, title, poster, added_at FROM watchlist WHERE user_id=? ORDER BY added_at DESC',
             (user_id,)
         )
-        return [{'path': r[0], 'category': r[1], 'title': r[2], 'poster': r[3], 'added_at': r[4]} for r in c.fetchall()]
+        return [{'path': r[0], 'category': r[1], 'title': r[2], 'poster': r[3], 'added_at': r[4]} for r in c]
     finally:
         return_db(conn)
 
@@ -1424,13 +2883,14 @@ def get_watchlist_paths(user_id: int) -> set:
     try:
         c = conn.cursor()
         c.execute('SELECT path FROM watchlist WHERE user_id=?', (user_id,))
-        return {r[0] for r in c.fetchall()}
+        return {r[0] for r in c}
     finally:
         return_db(conn)
 
 # ── Mark as watched ──────────────────────────────────────────────────────────
 def mark_watched(user_id: int, path: str, watched: bool = True):
-    conn = get_db()
+    flush_progress()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         if watched:
@@ -1446,7 +2906,7 @@ def mark_watched(user_id: int, path: str, watched: bool = True):
             c.execute('''
                 UPDATE progress SET watched = 0, current_time = 0 WHERE user_id=? AND path=?
             ''', (user_id, path))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -1464,9 +2924,8 @@ def get_recently_added(limit: int = 20) -> List[Dict]:
             ORDER BY li.indexed_at DESC
             LIMIT ?
         ''', (limit,))
-        rows = c.fetchall()
         results = []
-        for r in rows:
+        for r in c:
             results.append({
                 'path': r[0], 'category': r[1], 'name': r[2], 'folder': r[3],
                 'poster': r[8] or r[4],
@@ -1480,7 +2939,7 @@ def get_recently_added(limit: int = 20) -> List[Dict]:
 
 # ── Metadata override ────────────────────────────────────────────────────────
 def save_metadata_override(path: str, custom_title: str = None, custom_poster: str = None, plot: str = None, year: str = None):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('''
@@ -1492,7 +2951,7 @@ def save_metadata_override(path: str, custom_title: str = None, custom_poster: s
                 plot = COALESCE(excluded.plot, file_metadata.plot),
                 year = COALESCE(excluded.year, file_metadata.year)
         ''', (path, custom_title, custom_poster, plot, year))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -1500,12 +2959,12 @@ def save_metadata_override(path: str, custom_title: str = None, custom_poster: s
 # ── Playlists ─────────────────────────────────────────────────────────────────
 
 def create_playlist(user_id: int, name: str, description: str = "") -> int:
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('INSERT INTO playlists (user_id, name, description) VALUES (?, ?, ?)',
                   (user_id, name, description))
-        conn.commit()
+        _commit(conn)
         return c.lastrowid
     finally:
         return_db(conn)
@@ -1522,7 +2981,7 @@ def get_playlists(user_id: int) -> List[Dict]:
             GROUP BY p.id
             ORDER BY p.updated_at DESC
         ''', (user_id,))
-        return [dict(r) for r in c.fetchall()]
+        return [dict(r) for r in c]
     finally:
         return_db(conn)
 
@@ -1536,42 +2995,45 @@ def get_playlist(playlist_id: int, user_id: int) -> Optional[Dict]:
             return None
         playlist = dict(row)
         c.execute('SELECT * FROM playlist_items WHERE playlist_id = ? ORDER BY position', (playlist_id,))
-        playlist['items'] = [dict(r) for r in c.fetchall()]
+        playlist['items'] = [dict(r) for r in c]
         return playlist
     finally:
         return_db(conn)
 
 def add_to_playlist(playlist_id: int, path: str, title: str = "") -> int:
-    conn = get_db()
+    conn = get_write_db()
     try:
+        _begin(conn, immediate=True)
         c = conn.cursor()
         c.execute('SELECT MAX(position) FROM playlist_items WHERE playlist_id = ?', (playlist_id,))
         max_pos = c.fetchone()[0] or 0
         c.execute('INSERT INTO playlist_items (playlist_id, path, title, position) VALUES (?, ?, ?, ?)',
                   (playlist_id, path, title, max_pos + 1))
         c.execute('UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', (playlist_id,))
-        conn.commit()
+        _commit(conn)
         return c.lastrowid
     finally:
         return_db(conn)
 
 def remove_from_playlist(playlist_id: int, item_id: int):
-    conn = get_db()
+    conn = get_write_db()
     try:
+        _begin(conn)
         c = conn.cursor()
         c.execute('DELETE FROM playlist_items WHERE id = ? AND playlist_id = ?', (item_id, playlist_id))
         c.execute('UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', (playlist_id,))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
 def delete_playlist(playlist_id: int, user_id: int):
-    conn = get_db()
+    conn = get_write_db()
     try:
+        _begin(conn)
         c = conn.cursor()
         c.execute('DELETE FROM playlist_items WHERE playlist_id = ?', (playlist_id,))
         c.execute('DELETE FROM playlists WHERE id = ? AND user_id = ?', (playlist_id, user_id))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -1579,14 +3041,14 @@ def delete_playlist(playlist_id: int, user_id: int):
 # ── Ratings & Reviews ─────────────────────────────────────────────────────────
 
 def set_rating(user_id: int, path: str, rating: int, review: str = "") -> None:
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('''
             INSERT INTO ratings (user_id, path, rating, review) VALUES (?, ?, ?, ?)
             ON CONFLICT(user_id, path) DO UPDATE SET rating = ?, review = ?, created_at = CURRENT_TIMESTAMP
         ''', (user_id, path, rating, review, rating, review))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
 
@@ -1607,7 +3069,7 @@ def get_ratings_for_path(path: str) -> Dict:
         c.execute('SELECT AVG(rating) AS avg_rating, COUNT(*) AS count FROM ratings WHERE path = ?', (path,))
         row = c.fetchone()
         c.execute('SELECT r.*, u.username FROM ratings r JOIN users u ON r.user_id = u.id WHERE r.path = ? ORDER BY r.created_at DESC', (path,))
-        reviews = [dict(r) for r in c.fetchall()]
+        reviews = [dict(r) for r in c]
         return {
             "avg_rating": round(row['avg_rating'], 1) if row['avg_rating'] else None,
             "count": row['count'] or 0,
@@ -1617,10 +3079,10 @@ def get_ratings_for_path(path: str) -> Dict:
         return_db(conn)
 
 def delete_rating(user_id: int, path: str):
-    conn = get_db()
+    conn = get_write_db()
     try:
         c = conn.cursor()
         c.execute('DELETE FROM ratings WHERE user_id = ? AND path = ?', (user_id, path))
-        conn.commit()
+        _commit(conn)
     finally:
         return_db(conn)
@@ -4,6 +4,8 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import Response, JSONResponse
+from starlette.datastructures import MutableHeaders, QueryParams
+from starlette.requests import cookie_parser
 from app import database
 import sys
 import traceback
@@ -12,6 +14,7 @@ import traceback
 try:
     # Initialize database immediately
     database.init_db()
+    database.warm_reader_pool()
 
     # Now import routers and services
     from app.routers import auth
@@ -37,9 +40,10 @@ import mimetypes
 import logging
 import shutil
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
 
 # Configure logging
 LOG_FILE = "data/app.log"
@@ -101,32 +105,18 @@ def check_environment():
         results["checks"].append({"name": "database", "status": "fail", "error": str(e)})
         results["status"] = "error"
         
-    # 3. Check for external tools (Linux only)
+    # 3. Check for external tools (Linux only). Looked up on PATH, as the
+    # diagnostics endpoint does, rather than by running them: this is on the
+    # startup path, and `ffmpeg -version` alone loads every libav library.
     if os.name != 'nt':
-        # ffmpeg
-        try:
-            import subprocess
-            result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info("Environment check: ffmpeg is available")
-                results["checks"].append({"name": "ffmpeg", "status": "pass"})
-            else:
-                logger.warning("Environment check: ffmpeg is NOT available")
-                results["checks"].append({"name": "ffmpeg", "status": "warn"})
-        except Exception:
-            results["checks"].append({"name": "ffmpeg", "status": "fail"})
-
-        # NetworkManager (for WiFi management)
-        try:
-            result = subprocess.run(["nmcli", "--version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info("Environment check: nmcli is available")
-                results["checks"].append({"name": "nmcli", "status": "pass"})
+        # ffmpeg, and NetworkManager (for WiFi management)
+        for tool in ("ffmpeg", "nmcli"):
+            if shutil.which(tool):
+                logger.info(f"Environment check: {tool} is available")
+                results["checks"].append({"name": tool, "status": "pass"})
             else:
-                logger.warning("Environment check: nmcli is NOT available")
-                results["checks"].append({"name": "nmcli", "status": "warn"})
-        except Exception:
-            results["checks"].append({"name": "nmcli", "status": "fail"})
+                logger.warning(f"Environment check: {tool} is NOT available")
+                results["checks"].append({"name": tool, "status": "fail"})
             
     # 4. Load settings from database into environment
     try:
@@ -142,20 +132,27 @@ def check_environment():
 # Run check and store results for status endpoint
 ENV_CHECK_RESULTS = check_environment()
 
-# Add common media types for Windows compatibility
-mimetypes.add_type('audio/mpeg', '.mp3')
-mimetypes.add_type('audio/mp4', '.m4a')
-mimetypes.add_type('audio/ogg', '.ogg')
-mimetypes.add_type('audio/wav', '.wav')
-mimetypes.add_type('audio/flac', '.flac')
-mimetypes.add_type('video/mp4', '.mp4')
-mimetypes.add_type('video/x-matroska', '.mkv')
-mimetypes.add_type('video/webm', '.webm')
-mimetypes.add_type('image/jpeg', '.jpg')
-mimetypes.add_type('image/jpeg', '.jpeg')
-mimetypes.add_type('image/png', '.png')
-mimetypes.add_type('image/gif', '.gif')
-mimetypes.add_type('application/pdf', '.pdf')
+# Common media types, for Windows (no /etc/mime.types) and slim Linux images
+# that lack some of them. Only types the system map gets wrong or is missing
+# are registered, so a normal Pi install adds next to nothing at startup.
+_EXTRA_MIME = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.mp4': 'video/mp4',
+    '.mkv': 'video/x-matroska',
+    '.webm': 'video/webm',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.pdf': 'application/pdf',
+}
+for _ext, _type in _EXTRA_MIME.items():
+    if mimetypes.guess_type('x' + _ext)[0] != _type:
+        mimetypes.add_type(_type, _ext)
 
 def _run_startup_tasks():
     """Startup tasks: mount restoration, discovery, indexing, ingest."""
@@ -199,10 +196,20 @@ def _run_startup_tasks():
     except Exception as e:
         logger.warning(f"Failed to refresh external drive links: {e}")
 
-    # Start scheduler
-    scheduler.add_job(cleanup_old_uploads, 'interval', hours=12)
-    scheduler.start()
-    logger.info("Background scheduler started")
+    # Start scheduler. Jobs have fixed ids, so running the lifespan again in
+    # the same process (as TestClient does per client) replaces them instead
+    # of scheduling every job twice.
+    scheduler.add_job(cleanup_old_uploads, 'interval', hours=12,
+                      id="cleanup_old_uploads", replace_existing=True)
+    # Expired sessions are already rejected by get_session; this only prunes rows
+    scheduler.add_job(media.database.cleanup_sessions, 'interval', hours=1,
+                      id="cleanup_sessions", replace_existing=True)
+    # Writes the positions update_progress() buffered since the last run
+    scheduler.add_job(media.database.flush_progress, 'interval', seconds=media.database.PROGRESS_FLUSH_SECONDS,
+                      id="flush_progress", replace_existing=True)
+    if not scheduler.running:
+        scheduler.start()
+        logger.info("Background scheduler started")
 
     # Start Discovery Service
     try:
@@ -214,13 +221,7 @@ def _run_startup_tasks():
     # Staggered background tasks to prevent OOM on SBCs
     def run_staggered():
         time.sleep(10)
-        try:
-            media.database.cleanup_sessions()
-        except (OSError, IOError) as e:
-            logger.warning(f"Failed to cleanup sessions: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error during session cleanup: {e}")
-
+        # Expired sessions are pruned by the hourly scheduler job, not here
         cleanup_old_uploads()
 
         def needs_build(category: str):
@@ -278,7 +279,13 @@ async def lifespan(app):
 app = FastAPI(title="Nomad Pi", lifespan=lifespan)
 
 # Global Scheduler
-scheduler = BackgroundScheduler()
+# Three light interval jobs: two worker threads are plenty (the default is
+# ten). A job that comes due while the Pi is busy or was suspended runs once,
+# late, instead of being skipped after the default 1s grace with a warning.
+scheduler = BackgroundScheduler(
+    executors={"default": SchedulerThreadPool(max_workers=2)},
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 300},
+)
 
 def cleanup_old_uploads():
     """Clean up uploads older than 24 hours"""
@@ -286,23 +293,28 @@ def cleanup_old_uploads():
     if not UPLOAD_DIR.exists():
         return
         
-    cutoff = datetime.now() - timedelta(hours=24)
+    cutoff = time.time() - 24 * 3600
     logger.info(f"Running cleanup task for old uploads in {UPLOAD_DIR}...")
     
     count = 0
-    for item in UPLOAD_DIR.glob("*"):
-        try:
-            # Check both files and directories
-            mtime = datetime.fromtimestamp(item.stat().st_mtime)
-            if mtime < cutoff:
-                if item.is_dir():
-                    shutil.rmtree(item)
-                else:
-                    item.unlink()
-                count += 1
-                logger.info(f"Cleaned up old upload: {item}")
-        except Exception as e:
-            logger.error(f"Failed to cleanup {item}: {e}")
+    # One directory pass; scandir entries carry their type, so only the
+    # stat for the mtime hits the disk, and it is compared as a timestamp
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            try:
+                # Check both files and directories
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
+                    count += 1
+                    logger.info(f"Cleaned up old upload: {entry.path}")
+            except FileNotFoundError:
+                # Removed by something else since the directory was read
+                continue
+            except Exception as e:
+                logger.error(f"Failed to cleanup {entry.path}: {e}")
             
     if count > 0:
         logger.info(f"Cleanup finished. Removed {count} items.")
@@ -340,7 +352,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Enable GZip compression for API responses (improves load speed for large libraries)
+# Enable GZip compression for API responses (improves load speed for large libraries).
+# /data/ files are exempted by ProtectDataMiddleware.
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Create data directories if not exist
@@ -385,37 +398,82 @@ app.include_router(playlists.router)  # Playlists (has its own auth)
 app.include_router(playlists.ratings_router)  # Ratings & reviews (has its own auth)
 app.include_router(tmdb.router)  # TMDB integration (has its own auth)
 
-@app.middleware("http")
-async def protect_data(request: Request, call_next):
-    # Allow OPTIONS requests for CORS preflight
-    if request.method == "OPTIONS":
-        return await call_next(request)
-
-    if request.url.path.startswith("/data/"):
-        token = request.cookies.get("auth_token") or request.query_params.get("token")
-        
-        if not token:
-            logger.warning(f"Unauthorized access attempt (no token): {request.url.path}")
-            return Response(status_code=401)
-        
-        session = database.get_session(token)
-        if not session:
-            # Mask token for logging
-            masked_token = (token[:4] + "...") if token and len(token) > 4 else "****"
-            logger.warning(f"Unauthorized access attempt (invalid session): {request.url.path} | Token: {masked_token}")
-            return Response(status_code=401)
-    
-    response = await call_next(request)
-    p = request.url.path
-    if p == "/" or p.endswith(".html") or p.endswith(".js") or p.endswith(".css"):
-        response.headers["Cache-Control"] = "no-store"
-    if p.startswith("/api/"):
-        response.headers.setdefault("Cache-Control", "no-store")
-    response.headers.setdefault("X-Content-Type-Options", "nosniff")
-    ct = (response.headers.get("content-type") or "").strip().lower()
-    if ct == "application/json":
-        response.headers["content-type"] = "application/json; charset=utf-8"
-    return response
+# Responses the browser must always revalidate (the app shell and its assets)
+_NO_STORE_SUFFIXES = (".html", ".js", ".css")
+
+def _data_token(scope):
+    """The auth_token cookie, else the ?token= parameter, read off the scope."""
+    token = None
+    for key, value in scope["headers"]:
+        if key == b"cookie":
+            # A later Cookie header wins, as in Request.cookies
+            token = cookie_parser(value.decode("latin-1")).get("auth_token", token)
+    return token or QueryParams(scope["query_string"]).get("token")
+
+class ProtectDataMiddleware:
+    """Require a session for /data/ and set the common response headers.
+
+    A plain ASGI middleware rather than @app.middleware("http"): that one
+    relays every response body chunk through an extra task and memory
+    stream, and /data/ serves whole videos in 64 KiB chunks. Here the body
+    goes straight through; only the response start message is touched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Allow OPTIONS requests for CORS preflight
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # Read straight off the scope (what request.url.path is built from)
+        # rather than building a Request for every media range request
+        p = scope["path"]
+        if p.startswith("/data/"):
+            token = _data_token(scope)
+
+            if not token:
+                logger.warning(f"Unauthorized access attempt (no token): {p}")
+                await Response(status_code=401)(scope, receive, send)
+                return
+
+            session = database.get_session(token)
+            if not session:
+                # Mask token for logging
+                masked_token = (token[:4] + "...") if token and len(token) > 4 else "****"
+                logger.warning(f"Unauthorized access attempt (invalid session): {p} | Token: {masked_token}")
+                await Response(status_code=401)(scope, receive, send)
+                return
+
+            # Media is already compressed (and .ts, .epub, .cbz and the like
+            # are not on GZipMiddleware's skip list): without Accept-Encoding
+            # it passes /data/ files straight through instead of gzipping
+            # every chunk on the Pi's CPU
+            scope = dict(scope, headers=[(k, v) for k, v in scope["headers"] if k != b"accept-encoding"])
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if p == "/" or p.endswith(_NO_STORE_SUFFIXES):
+                    headers["Cache-Control"] = "no-store"
+                if p.startswith("/api/"):
+                    headers.setdefault("Cache-Control", "no-store")
+                headers.setdefault("X-Content-Type-Options", "nosniff")
+                ct = (headers.get("content-type") or "").strip().lower()
+                if ct == "application/json":
+                    headers["content-type"] = "application/json; charset=utf-8"
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+# Added last, so it is the outermost middleware, as the decorator was
+app.add_middleware(ProtectDataMiddleware)
 
 # Mount data for direct access (streaming)
 # Note: Protecting StaticFiles via dependency is tricky without a custom middleware or proxy.
@@ -437,6 +495,8 @@ if __name__ == "__main__":
         host="0.0.0.0", 
         port=8000, 
         reload=False, 
+        # uvloop and httptools where requirements.txt installs them (64-bit),
+        # asyncio and h11 elsewhere; naming them would fail without them
         loop="auto", 
         http="auto",
         limit_concurrency=1000,  # Allow more concurrent connections
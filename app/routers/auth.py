@@ -83,8 +83,7 @@ logger = logging.getLogger(__name__)
 
 def ensure_admin_user():
     """Ensures at least one admin user exists."""
-    users = database.get_all_users()
-    if not users:
+    if not database.has_users():
         # Create default admin user
         must_change = True  # Always force change for first-time setup
         if ADMIN_PASSWORD:
@@ -179,10 +178,12 @@ def login(request: LoginRequest, request_obj: Request):
     if user and verified:
         # Clear attempts on success
         clear_attempts(login_attempts, client_ip)
-        # Rotate session: invalidate any existing sessions for this user
-        database.delete_user_sessions(user['id'])
+        # Rotate session: invalidate any existing sessions for this user and
+        # open the new one in the same commit
         token = str(uuid.uuid4())
-        database.create_session(token, user['id'])
+        with database.bulk():
+            database.delete_user_sessions(user['id'])
+            database.create_session(token, user['id'])
 
         response = JSONResponse(content={
             "status": "ok",
@@ -349,17 +350,15 @@ def check_auth(request: Request):
             token = auth_header.split(" ")[1]
 
     if token:
-        session = database.get_session(token)
-        if session:
-            user = database.get_user_by_id(session['user_id'])
-            if user:
-                return {
-                    "authenticated": True,
-                    "user": {
-                        "id": user['id'],
-                        "username": user['username'],
-                        "is_admin": bool(user['is_admin']),
-                        "must_change_password": bool(user.get('must_change_password', 0))
-                    }
+        user = database.get_session_user(token)
+        if user:
+            return {
+                "authenticated": True,
+                "user": {
+                    "id": user['id'],
+                    "username": user['username'],
+                    "is_admin": bool(user['is_admin']),
+                    "must_change_password": bool(user.get('must_change_password', 0))
                 }
+            }
     return {"authenticated": False}
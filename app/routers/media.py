@@ -333,7 +333,10 @@ def safe_fs_path_from_web_path(web_path: str):
     return str(fs_path)
 
 def natural_sort_key(s):
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'([0-9]+)', s)]
+    # The same text key library_index stores in name_sort/folder_sort, so
+    # lists sorted here agree with pages sorted by SQLite. Memoized: folder
+    # keys repeat for every episode of a season in the sorts below.
+    return database.natural_sort_key_text(s)
 
 def guess_title_year(name: str):
     # Remove extension
@@ -795,8 +798,7 @@ async def get_shows_library(user_id: int = Depends(get_current_user_id)):
         
         # Aggregate genres and years
         if r.get("genre"):
-            for g in r.get("genre").split(','):
-                shows_dict[show_name]["genres"].add(g.strip())
+            shows_dict[show_name]["genres"].update(database.split_genres(r["genre"]))
         if r.get("year"):
             shows_dict[show_name]["years"].add(str(r.get("year")))
         
@@ -931,13 +933,13 @@ async def get_shows_library(user_id: int = Depends(get_current_user_id)):
         
     # Convert to list structure
     out = []
-    for s_name in sorted(shows_dict.keys(), key=database.natural_sort_key_list):
+    for s_name in sorted(shows_dict.keys(), key=database.natural_sort_key_text):
         show = shows_dict[s_name]
         seasons = []
-        for sea_name in sorted(show["seasons"].keys(), key=database.natural_sort_key_list):
+        for sea_name in sorted(show["seasons"].keys(), key=database.natural_sort_key_text):
             season = show["seasons"][sea_name]
             # Sort episodes by episode number, then by natural name
-            season["episodes"].sort(key=lambda x: (x["ep_num"], database.natural_sort_key_list(x["name"])))
+            season["episodes"].sort(key=lambda x: (x["ep_num"], database.natural_sort_key_text(x["name"])))
             seasons.append(season)
         show["seasons"] = seasons
         # Convert sets to sorted lists
@@ -1039,7 +1041,7 @@ def get_next_show_episode(path: str = Query(...), user_id: int = Depends(get_cur
         if not entries:
             return None
 
-        entries.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_list(x.get("name") or "")))
+        entries.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_text(x.get("name") or "")))
         cur_index = next((i for i, ep in enumerate(entries) if ep.get("path") == path), -1)
         if cur_index == -1:
             try:
@@ -1095,7 +1097,7 @@ def get_next_show_episode(path: str = Query(...), user_id: int = Depends(get_cur
             }
             for r in season_rows
         ]
-        season_eps.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_list(x.get("name") or "")))
+        season_eps.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_text(x.get("name") or "")))
 
         cur_index = next((i for i, ep in enumerate(season_eps) if ep.get("path") == path), -1)
         if cur_index == -1:
@@ -1107,9 +1109,12 @@ def get_next_show_episode(path: str = Query(...), user_id: int = Depends(get_cur
             next_ep["season"] = season_name
             return {"next": next_ep}
 
+        # Season folders of the show as a range on idx_library_category_folder_name
+        # ('0' sorts right after '/'). LIKE could not use that index, and would
+        # treat '%' and '_' in the show name as wildcards.
         c.execute(
-            "SELECT DISTINCT folder FROM library_index WHERE category = 'shows' AND folder LIKE ?",
-            (f"{show_name}/%",),
+            "SELECT DISTINCT folder FROM library_index WHERE category = 'shows' AND folder > ? AND folder < ?",
+            (f"{show_name}/", f"{show_name}0"),
         )
         season_folders = [r["folder"] for r in c.fetchall() if r.get("folder")]
         seasons = []
@@ -1129,7 +1134,7 @@ def get_next_show_episode(path: str = Query(...), user_id: int = Depends(get_cur
         if not seasons:
             return {"next": None}
 
-        seasons.sort(key=lambda s: (s["season_num"], database.natural_sort_key_list(s["season"])))
+        seasons.sort(key=lambda s: (s["season_num"], database.natural_sort_key_text(s["season"])))
         cur_season_num = parse_season_num(season_name)
         next_season = None
         for s in seasons:
@@ -1156,7 +1161,7 @@ def get_next_show_episode(path: str = Query(...), user_id: int = Depends(get_cur
             }
             for r in next_rows
         ]
-        next_eps.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_list(x.get("name") or "")))
+        next_eps.sort(key=lambda x: (x["ep_num"], database.natural_sort_key_text(x.get("name") or "")))
         if not next_eps:
             return {"next": None}
 
@@ -1179,13 +1184,12 @@ def get_media_stats(user_id: int = Depends(get_current_user_id)):
         "books": 0
     }
     
-    for category in stats.keys():
-        try:
-            # Check library index
-            items, total = database.query_library_index(category, limit=1, user_id=user_id)
-            stats[category] = total
-        except Exception:
-            # Fallback to file count if index doesn't exist
+    try:
+        # Check library index: every category in one query
+        stats.update(database.count_library_index(list(stats)))
+    except Exception:
+        # Fallback to file count if index doesn't exist
+        for category in stats.keys():
             count = 0
             paths = get_scan_paths(category)
             for p in paths:
@@ -1223,6 +1227,10 @@ def rebuild_library(background_tasks: BackgroundTasks, admin: dict = Depends(get
     return {"status": "Library rebuild and organization started in background"}
 
 def build_library_index(category: str):
+    with database.scan_mode():
+        _build_library_index(category)
+
+def _build_library_index(category: str):
     paths_to_scan = get_scan_paths(category)
     count = 0
     batch = []
@@ -1331,15 +1339,12 @@ def build_library_index(category: str):
                         if parent != base and parent != BASE_DIR:
                             p_url = find_local_poster(parent)
 
-                # Priority 4: Database-cached poster (from previous OMDb fetches)
-                meta = database.get_file_metadata(web_path)
-                if not p_url and meta:
-                    if meta.get("poster"):
-                        p_url = meta.get("poster")
-                    elif meta.get("meta"):
-                        m_data = meta.get("meta")
-                        if isinstance(m_data, dict) and m_data.get("Poster") and m_data["Poster"] != "N/A":
-                            p_url = m_data["Poster"]
+                # Priority 4: Database-cached poster (from previous OMDb fetches).
+                # The poster column is filled from the OMDb Poster field, so the
+                # raw JSON is not needed here.
+                meta = database.get_file_metadata_lite(web_path)
+                if not p_url and meta and meta.get("poster"):
+                    p_url = meta.get("poster")
 
                 item = {
                     "path": web_path,
@@ -1356,7 +1361,9 @@ def build_library_index(category: str):
                 
                 seen_paths.add(web_path)
                 batch.append(item)
-                if len(batch) >= 500:
+                # One transaction and one commit per batch; the writer is not
+                # held across the filesystem walk between batches
+                if len(batch) >= database.LIBRARY_INDEX_BATCH_SIZE:
                     database.upsert_library_index_items(batch)
                     batch = []
                 count += 1
@@ -1365,11 +1372,13 @@ def build_library_index(category: str):
                         _scan_state["count"] = count
                         _scan_state["message"] = f"Scanning {category}… {count} files"
 
-    if batch:
-        database.upsert_library_index_items(batch)
-    # Remove stale entries (files that were indexed before but no longer exist on disk)
-    database.remove_stale_library_entries(category, seen_paths)
-    database.set_library_index_state(category, count)
+    # Last batch, stale-entry cleanup and the scan state land in one commit
+    with database.bulk():
+        if batch:
+            database.upsert_library_index_items(batch)
+        # Remove stale entries (files that were indexed before but no longer exist on disk)
+        database.remove_stale_library_entries(category, seen_paths)
+        database.set_library_index_state(category, count)
     with _scan_lock:
         if _scan_state["running"] > 0:
             _scan_state["running"] = _scan_state["running"] - 1
@@ -1438,6 +1447,7 @@ def scan_media_page(category: str, q: str, offset: int, limit: int):
         allowed = {'.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mov'}
 
     matched = []
+    to_index = []
     for base in paths_to_scan:
         if not os.path.exists(base):
             continue
@@ -1515,10 +1525,7 @@ def scan_media_page(category: str, q: str, offset: int, limit: int):
                         "mtime": float(getattr(st, "st_mtime", 0.0) or 0.0),
                         "size": int(getattr(st, "st_size", 0) or 0),
                     }
-                    # We could batch these, but since scan_media_page is for small-ish result sets (limit 200),
-                    # individual upserts are okay, but let's at least make sure it's not slowing down the search UI too much.
-                    # Actually, for consistency with build_library_index, let's use the batching pattern if we want to be thorough.
-                    database.upsert_library_index_item(item_to_index)
+                    to_index.append(item_to_index)
                 except Exception:
                     pass
                 if len(matched) >= want:
@@ -1528,6 +1535,12 @@ def scan_media_page(category: str, q: str, offset: int, limit: int):
         if len(matched) >= want:
             break
 
+    # Index everything we touched in one transaction rather than one commit per file
+    if to_index:
+        try:
+            database.upsert_library_index_items(to_index)
+        except Exception as e:
+            logger.warning(f"Failed to index scanned {category} files: {e}")
     matched.sort(key=lambda x: (natural_sort_key(x.get("folder") or "."), natural_sort_key(x.get("name") or "")))
     return matched[offset: offset + limit]
 
@@ -1549,7 +1562,7 @@ def get_similar_media(path: str = Query(...), user_id: int = Depends(get_current
     """Get similar media items for a given path."""
     items = database.get_similar_media(path)
     # Add progress information for the user
-    all_progress = database.get_all_progress(user_id)
+    all_progress = database.get_progress_many(user_id, [item['path'] for item in items])
     for item in items:
         if item['path'] in all_progress:
             item['progress'] = all_progress[item['path']]
@@ -1564,6 +1577,7 @@ def get_library(
     sort: str = Query(default='name'),
     genre: str = Query(default=None),
     year: str = Query(default=None),
+    after: str = Query(default=None),
     user_id: int = Depends(get_current_user_id)
 ):
     # Handle FastAPI Query objects if passed directly in tests
@@ -1573,6 +1587,7 @@ def get_library(
     if hasattr(sort, 'default'): sort = sort.default
     if hasattr(genre, 'default'): genre = genre.default
     if hasattr(year, 'default'): year = year.default
+    if hasattr(after, 'default'): after = after.default
 
     # Ensure integer types for numeric params
     try:
@@ -1596,7 +1611,7 @@ def get_library(
         if category == 'shows':
             items, total = database.query_shows(q=q, offset=offset, limit=limit, sort=sort, genre=genre, year=year, user_id=user_id)
         else:
-            items, total = database.query_library_index(category, q=q, offset=offset, limit=limit, sort=sort, genre=genre, year=year, user_id=user_id)
+            items, total = database.query_library_index(category, q=q, offset=offset, limit=limit, sort=sort, genre=genre, year=year, user_id=user_id, after=after)
             
         if total > 0 or q or genre or year:
             # database.query_library_index/query_shows already joins with progress
@@ -1612,13 +1627,20 @@ def get_library(
                         "last_played": item.get("last_played")
                     }
 
-            return {
+            result = {
                 "items": items, 
                 "total": total, 
                 "next_offset": offset + len(items),
                 "has_more": (offset + len(items)) < total,
                 "source": "database"
             }
+            # Name-sorted file pages can be continued with ?after=<next_cursor>,
+            # which avoids rescanning the skipped rows on deep pages
+            if category != 'shows' and sort == 'name' and items:
+                result["next_cursor"] = database.library_cursor(items[-1])
+                if after:
+                    result["has_more"] = len(items) >= limit
+            return result
     except Exception as e:
         logger.error(f"Database query failed for {category}: {e}")
 
@@ -1627,7 +1649,7 @@ def get_library(
     
     # Add progress information even for filesystem results if possible
     try:
-        all_progress = database.get_all_progress(user_id)
+        all_progress = database.get_progress_many(user_id, [item.get('path') for item in items])
         for item in items:
             if item.get('path') in all_progress:
                 item['progress'] = all_progress[item['path']]
@@ -2038,12 +2060,7 @@ async def get_metadata(path: str = Query(...), fetch: bool = Query(default=False
     
     # Also update the library index with genre, year and poster
     try:
-        database.upsert_library_index_item({
-            "path": path,
-            "genre": meta.get("Genre"),
-            "year": meta.get("Year"),
-            "poster": meta.get("Poster")
-        })
+        database.update_library_index_metadata(path, genre=meta.get("Genre"), year=meta.get("Year"), poster=meta.get("Poster"))
     except Exception:
         pass
 
@@ -2686,9 +2703,6 @@ def extract_archive_to_dir(archive_path: str, out_dir: str):
 def list_media(category: str, user_id: int = Depends(get_current_user_id)):
     paths_to_scan = get_scan_paths(category)
     files = []
-    
-    # Get all progress to merge
-    all_progress = database.get_all_progress(user_id)
 
     for path in paths_to_scan:
         if not os.path.exists(path):
@@ -2733,15 +2747,17 @@ def list_media(category: str, user_id: int = Depends(get_current_user_id)):
                             parent = os.path.dirname(root)
                             if parent != path and parent != BASE_DIR:
                                 item["poster"] = find_local_poster(parent)
-                    
-                    # Add progress if exists
-                    if web_path in all_progress:
-                        item["progress"] = all_progress[web_path]
-                    
+
                     files.append(item)
                 except ValueError:
                     continue
 
+    # Progress for just the files listed, not every row the user has
+    progress = database.get_progress_many(user_id, [item["path"] for item in files])
+    for item in files:
+        if item["path"] in progress:
+            item["progress"] = progress[item["path"]]
+
     files.sort(key=lambda x: (natural_sort_key(x.get("folder") or "."), natural_sort_key(x.get("name") or "")))
     return files
 
@@ -2794,12 +2810,13 @@ def set_progress(data: Dict = Body(...), user_id: int = Depends(get_current_user
             _progress_log_next_at[log_key] = now + 60.0
             logger.info(f"Progress user={user_id} path={path} t={current_time:.1f} d={(duration or 0):.1f}")
 
-        database.update_progress(user_id, path, current_time, float(duration or 0))
-        
-        # If progress is near the end (e.g., > 95%), mark as played
+        # If progress is near the end (e.g., > 95%), mark as played. This
+        # checks the previous position, so it runs before the update.
         if duration and duration > 0:
-            if (current_time / duration) > 0.95:
-                database.increment_play_count(user_id, path)
+            if (current_time / duration) > database.PLAY_FINISHED_FRACTION:
+                database.count_finished_play(user_id, path)
+
+        database.update_progress(user_id, path, current_time, float(duration or 0))
                 
         return {"status": "ok"}
     except Exception as e:
@@ -3599,6 +3616,7 @@ async def upload_file(category: str, background_tasks: BackgroundTasks, files: U
     file_list = [files] if not isinstance(files, list) else files
     
     saved_files = []
+    to_index = []
     for file in file_list:
         incoming_name = (file.filename or "").replace("\\", "/")
         normalized = posixpath.normpath(incoming_name).lstrip("/")
@@ -3617,7 +3635,7 @@ async def upload_file(category: str, background_tasks: BackgroundTasks, files: U
             rel_path = os.path.relpath(file_location, BASE_DIR).replace(os.sep, "/")
             web_path = f"/data/{rel_path}"
             folder = os.path.relpath(os.path.dirname(file_location), path).replace(os.sep, "/")
-            database.upsert_library_index_item({
+            to_index.append({
                 "path": web_path,
                 "category": category,
                 "name": os.path.basename(file_location),
@@ -3629,6 +3647,12 @@ async def upload_file(category: str, background_tasks: BackgroundTasks, files: U
             })
         except Exception:
             pass
+
+    if to_index:
+        try:
+            database.upsert_library_index_items(to_index)
+        except Exception:
+            pass
     
     # Trigger background tasks for rescan and auto-organization
     background_tasks.add_task(trigger_dlna_rescan)
@@ -3696,7 +3720,7 @@ def delete_media(path: str, background_tasks: BackgroundTasks, admin: dict = Dep
         raise HTTPException(status_code=404, detail="File not found")
     
     try:
-        meta = database.get_file_metadata(path)
+        poster_url = database.get_file_metadata_poster(path)
         
         logger.info(f"Attempting to delete {fs_path} (from web path {path})")
         
@@ -3714,11 +3738,6 @@ def delete_media(path: str, background_tasks: BackgroundTasks, admin: dict = Dep
             database.delete_library_index_item(path)
         
         try:
-            poster_url = None
-            if meta and meta.get("poster"):
-                poster_url = meta.get("poster")
-            elif meta and isinstance(meta.get("meta"), dict) and meta["meta"].get("Poster"):
-                poster_url = meta["meta"].get("Poster")
             if poster_url and isinstance(poster_url, str) and poster_url.startswith("/data/cache/posters/"):
                 poster_fs = safe_fs_path_from_web_path(poster_url)
                 if os.path.exists(poster_fs):
@@ -3757,6 +3776,8 @@ def delete_media_batch(req: BatchDeleteRequest, background_tasks: BackgroundTask
 
     deleted = []
     failed = []
+    # Removed files are dropped from the index together after the loop
+    removed_files = []
 
     for web_path in paths:
         try:
@@ -3765,7 +3786,7 @@ def delete_media_batch(req: BatchDeleteRequest, background_tasks: BackgroundTask
                 failed.append({"path": web_path, "error": "File not found"})
                 continue
 
-            meta = database.get_file_metadata(web_path)
+            poster_url = database.get_file_metadata_poster(web_path)
             is_dir = os.path.isdir(fs_path)
 
             if is_dir:
@@ -3773,14 +3794,9 @@ def delete_media_batch(req: BatchDeleteRequest, background_tasks: BackgroundTask
                 database.delete_library_index_items_by_prefix(web_path)
             else:
                 os.remove(fs_path)
-                database.delete_library_index_item(web_path)
+                removed_files.append(web_path)
 
             try:
-                poster_url = None
-                if meta and meta.get("poster"):
-                    poster_url = meta.get("poster")
-                elif meta and isinstance(meta.get("meta"), dict) and meta["meta"].get("Poster"):
-                    poster_url = meta["meta"].get("Poster")
                 if poster_url and isinstance(poster_url, str) and poster_url.startswith("/data/cache/posters/"):
                     poster_fs = safe_fs_path_from_web_path(poster_url)
                     if os.path.exists(poster_fs):
@@ -3805,6 +3821,8 @@ def delete_media_batch(req: BatchDeleteRequest, background_tasks: BackgroundTask
         except Exception as e:
             failed.append({"path": web_path, "error": str(e)})
 
+    database.delete_library_index_items(removed_files)
+
     if deleted:
         background_tasks.add_task(trigger_dlna_rescan)
 
@@ -3856,14 +3874,11 @@ def fix_duplicates(background_tasks: BackgroundTasks, admin: dict = Depends(get_
     def run_fix():
         logger.info("Starting mass duplicate fix...")
         
-        # 1. Fix duplicate files (same name and size)
-        file_dupes = database.fix_duplicate_files()
-        # 2. Fix duplicate content (same IMDb ID)
-        content_dupes = database.fix_duplicate_content()
-        
-        # Merge and remove duplicates from the list
-        all_to_delete = list(set(file_dupes + content_dupes))
+        # Duplicate files (same name and size) and duplicate content (same
+        # IMDb ID), each path once
+        all_to_delete = database.fix_duplicates()
         deleted_count = 0
+        removed = []
         
         for path in all_to_delete:
             try:
@@ -3875,11 +3890,13 @@ def fix_duplicates(background_tasks: BackgroundTasks, admin: dict = Depends(get_
                     else:
                         os.remove(fs_path)
                     
-                    # Clean up database
-                    database.delete_library_index_item(path)
+                    removed.append(path)
                     deleted_count += 1
             except Exception as e:
                 logger.error(f"Failed to delete duplicate {path}: {e}")
+
+        # Clean up database
+        database.delete_library_index_items(removed)
         
         logger.info(f"Mass duplicate fix completed. Deleted {deleted_count} items.")
         
@@ -3905,33 +3922,10 @@ def get_duplicates(user_id: int = Depends(get_current_user_id)):
         file_dupes = database.find_duplicate_files()
         meta_dupes = database.find_duplicate_metadata()
         
-        # Format file duplicates
-        formatted_files = []
-        for d in file_dupes:
-            paths = d["paths"].split("|")
-            formatted_files.append({
-                "name": d["name"],
-                "size": d["size"],
-                "category": d["category"],
-                "count": d["count"],
-                "paths": paths
-            })
-            
-        # Format metadata duplicates
-        formatted_meta = []
-        for d in meta_dupes:
-            paths = d["paths"].split("|")
-            formatted_meta.append({
-                "imdb_id": d["imdb_id"],
-                "title": d["title"],
-                "media_type": d["media_type"],
-                "count": d["count"],
-                "paths": paths
-            })
-            
+        # The groups already have the response's fields, paths as a list
         return {
-            "file_duplicates": formatted_files,
-            "content_duplicates": formatted_meta
+            "file_duplicates": file_dupes,
+            "content_duplicates": meta_dupes
         }
     except Exception as e:
         logger.error(f"Error finding duplicates: {e}")
@@ -3969,44 +3963,41 @@ def find_file_poster(web_path: str):
 
 @router.get("/resume")
 def resume(limit: int = 12, user_id: int = Depends(get_current_user_id)):
-    all_progress = database.get_all_progress(user_id)
+    limit = max(1, min(int(limit), 50))
     items = []
-    for web_path, prog in all_progress.items():
-        try:
-            t = float(prog.get("current_time") or 0)
-            d = float(prog.get("duration") or 0)
-        except Exception:
-            continue
-        if not (t > 10 and (d <= 0 or (d - t) > 10)):
-            continue
-
-        try:
-            fs_path = safe_fs_path_from_web_path(web_path)
-        except HTTPException:
-            continue
-        if not os.path.isfile(fs_path):
-            continue
-
-        name = os.path.basename(fs_path)
-        rel = os.path.relpath(fs_path, BASE_DIR).replace(os.sep, "/")
-        parts = rel.split("/")
-        media_type = parts[0] if parts else "media"
-        items.append({
-            "name": name, 
-            "path": web_path, 
-            "type": media_type, 
-            "progress": prog,
-            "poster": find_file_poster(web_path)
-        })
+    # Unfinished items arrive newest first, a page at a time; stop as soon as
+    # enough of them still exist on disk instead of checking every one
+    page_size = 50
+    offset = 0
+    while len(items) < limit:
+        page = database.get_recent_progress(user_id, limit=page_size, offset=offset)
+        for prog in page:
+            web_path = prog["path"]
+            try:
+                fs_path = safe_fs_path_from_web_path(web_path)
+            except HTTPException:
+                continue
+            if not os.path.isfile(fs_path):
+                continue
 
-    def last_played(item):
-        lp = item.get("progress", {}).get("last_played")
-        if isinstance(lp, str) and lp:
-            return lp
-        return ""
+            name = os.path.basename(fs_path)
+            rel = os.path.relpath(fs_path, BASE_DIR).replace(os.sep, "/")
+            parts = rel.split("/")
+            media_type = parts[0] if parts else "media"
+            items.append({
+                "name": name,
+                "path": web_path,
+                "type": media_type,
+                "progress": prog,
+                "poster": find_file_poster(web_path)
+            })
+            if len(items) >= limit:
+                break
+        if len(page) < page_size:
+            break
+        offset += page_size
 
-    items.sort(key=last_played, reverse=True)
-    return {"items": items[: max(1, min(int(limit), 50))]}
+    return {"items": items}
 
 @router.get("/books/comic/pages")
 def comic_pages(path: str, user_id: int = Depends(get_current_user_id)):
@@ -4271,25 +4262,4 @@ def search_library(q: str, limit: int = 40, user_id: int = Depends(get_current_u
     """Global search across all library categories."""
     if not q or len(q.strip()) < 2:
         return {"results": []}
-    safe_q = database.sanitize_like_pattern(q.strip())
-    conn = database.get_db()
-    try:
-        rows = conn.execute(
-            """
-            SELECT li.path, li.category, li.name, li.folder, li.year,
-                   COALESCE(fm.custom_title, fm.title, li.name) AS title,
-                   COALESCE(fm.custom_poster, fm.poster, li.poster)  AS poster
-            FROM library_index li
-            LEFT JOIN file_metadata fm ON fm.path = li.path
-            WHERE li.name LIKE ? ESCAPE '\\'
-               OR fm.title LIKE ? ESCAPE '\\'
-               OR fm.custom_title LIKE ? ESCAPE '\\'
-            ORDER BY li.name COLLATE NATSORT
-            LIMIT ?
-            """,
-            (f"%{safe_q}%", f"%{safe_q}%", f"%{safe_q}%", int(limit))
-        ).fetchall()
-        results = [dict(r) for r in rows]
-        return {"results": results}
-    finally:
-        database.return_db(conn)
+    return {"results": database.search_library(q.strip(), limit=limit)}
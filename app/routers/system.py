@@ -121,11 +121,11 @@ def get_setup_status():
     admin_password_hash = os.environ.get("ADMIN_PASSWORD_HASH")
     allow_insecure_default = os.environ.get("ALLOW_INSECURE_DEFAULT", "true").lower() == "true"
 
-    users = []
+    users_exist = False
     try:
-        users = database.get_all_users() or []
+        users_exist = database.has_users()
     except Exception:
-        users = []
+        users_exist = False
 
     admin_user = None
     try:
@@ -140,7 +140,7 @@ def get_setup_status():
     has_default_password = admin_must_change_password and allow_insecure_default and not admin_password and not admin_password_hash
 
     return {
-        "users_exist": bool(users),
+        "users_exist": users_exist,
         "default_username": "admin",
         "has_default_password": has_default_password,
         "admin_must_change_password": admin_must_change_password,
@@ -2450,6 +2450,8 @@ def download_backup(admin: dict = Depends(get_current_admin)):
             # Use data/nomad.db as seen in create_backup and ls data
             db_path = "data/nomad.db"
             if os.path.exists(db_path):
+                # Include playback positions still waiting to be written
+                database.flush_progress()
                 # Use a temporary file for a clean SQLite backup
                 with tempfile.NamedTemporaryFile(delete=False) as tmp:
                     temp_db = tmp.name
@@ -2540,6 +2542,7 @@ def create_backup(admin: dict = Depends(get_current_admin)):
             # Backup database (safe copy via SQLite backup API)
             temp_db = os.path.join(backup_dir, f"_temp_backup_{timestamp}.db")
             try:
+                database.flush_progress()
                 src = sqlite3.connect(db_path)
                 dst = sqlite3.connect(temp_db)
                 src.backup(dst)
@@ -2645,9 +2648,17 @@ def restore_backup(
                 new_db = os.path.join(extract_dir, db_entry)
                 if os.path.exists(new_db):
                     old_db = "data/nomad.db"
-                    if os.path.exists(old_db):
-                        shutil.copy2(old_db, old_db + ".bak")
-                    shutil.copy2(new_db, old_db)
+                    # Close the pooled connections first: that folds the WAL
+                    # into old_db, and stops them writing the old WAL over
+                    # the restored file. They stay closed until the copy is
+                    # done, so nothing reopens old_db halfway through.
+                    with database.connections_closed():
+                        if os.path.exists(old_db):
+                            shutil.copy2(old_db, old_db + ".bak")
+                        shutil.copy2(new_db, old_db)
+                        for suffix in ("-wal", "-shm"):
+                            if os.path.exists(old_db + suffix):
+                                os.remove(old_db + suffix)
 
                 # Restore mounts.json
                 new_mounts = os.path.join(extract_dir, "mounts.json")
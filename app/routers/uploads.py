@@ -449,6 +449,7 @@ async def upload_multiple_files(
     from app import database
     import os
 
+    to_index = []
     for file in files:
         file_id = hashlib.md5(f"{file.filename}{datetime.utcnow()}".encode()).hexdigest()
         
@@ -476,7 +477,7 @@ async def upload_multiple_files(
                 cat_root = os.path.join("data", resolved_category)
                 folder = os.path.relpath(os.path.dirname(destination), cat_root).replace(os.sep, "/")
                 
-                database.upsert_library_index_item({
+                to_index.append({
                     "path": web_path,
                     "category": resolved_category,
                     "name": file.filename,
@@ -503,6 +504,13 @@ async def upload_multiple_files(
             logger.error(f"Upload failed for {file.filename}: {str(e)}")
             failed_count += 1
     
+    # Index all uploaded files in a single transaction
+    if to_index:
+        try:
+            database.upsert_library_index_items(to_index)
+        except Exception as e:
+            logger.error(f"Failed to index uploaded files: {e}")
+
     total_time = time.time() - start_time
     
     # Trigger MiniDLNA rescan and auto-organization if any files were uploaded
@@ -25,6 +25,33 @@ def client():
         yield c
 
 
+@pytest.fixture
+def library_items(client):
+    """Index files into one folder of a category; they are removed after the test.
+
+    ``library_items(category, folder, names)`` upserts one item per name and
+    returns them.
+    """
+    from app import database
+    folders = []
+
+    def add(category, folder, names):
+        items = [
+            {
+                "path": f"/data/{category}/{folder}/{name}", "category": category,
+                "name": name, "folder": folder, "mtime": float(n), "size": 1,
+            }
+            for n, name in enumerate(names, 1)
+        ]
+        database.upsert_library_index_items(items)
+        folders.append(f"/data/{category}/{folder}")
+        return items
+
+    yield add
+    for folder in folders:
+        database.delete_library_index_items_by_prefix(folder)
+
+
 def test_app_boots_and_serves_index(client):
     res = client.get("/")
     assert res.status_code == 200
@@ -154,3 +181,96 @@ class TestRemuxHelpers:
         assert out1a == out1b, "same source must map to same cache file"
         assert out1a != out2, "different sources must not collide"
         assert out1a.endswith(".mp4") and web1.startswith("/data/")
+
+
+class TestNaturalSort:
+    def test_sort_key_text_matches_natural_order(self):
+        from app.database import natural_sort_key_list, natural_sort_key_text
+        names = ["Episode 10.mkv", "episode 2.mkv", "Episode 1.mkv", "Season 02", "Season 1", "a", "B", "Movie 100", "Movie 20"]
+        by_text = sorted(names, key=natural_sort_key_text)
+        assert by_text == sorted(names, key=natural_sort_key_list)
+        assert by_text.index("Episode 1.mkv") < by_text.index("episode 2.mkv") < by_text.index("Episode 10.mkv")
+
+
+class TestProgressBuffer:
+    def test_latest_position_is_read_back_and_deletes_are_not_undone(self, client):
+        from app import database
+        user_id = database.create_user("progress_buffer_test", "x")
+        try:
+            for t in (10.0, 20.0, 30.0):
+                database.update_progress(user_id, "/data/movies/buffered.mkv", t, 100.0)
+            assert database.get_progress(user_id, "/data/movies/buffered.mkv")["current_time"] == 30.0
+
+            database.update_progress(user_id, "/data/movies/buffered.mkv", 40.0, 100.0)
+            database.delete_library_index_items(["/data/movies/buffered.mkv"])
+            assert database.get_progress(user_id, "/data/movies/buffered.mkv") is None
+        finally:
+            database.delete_user(user_id)
+
+    def test_reads_overlay_pending_positions_without_flushing(self, client):
+        from app import database
+        user_id = database.create_user("progress_overlay_test", "x")
+        path = "/data/movies/overlay.mkv"
+        try:
+            database.update_progress(user_id, path, 30.0, 100.0)
+            database.flush_progress()
+            database.update_progress(user_id, path, 60, 0)
+
+            progress = database.get_progress(user_id, path)
+            assert progress["current_time"] == 60.0 and isinstance(progress["current_time"], float)
+            assert database.get_progress_many(user_id, [path])[path]["duration"] == 100.0
+            assert [p["current_time"] for p in database.get_recent_progress(user_id)] == [60.0]
+
+            database.flush_progress()
+            stored = database.get_all_progress(user_id)[path]
+            assert (stored["current_time"], stored["duration"]) == (60.0, 100.0)
+        finally:
+            database.delete_user(user_id)
+
+
+class TestSessionCache:
+    def test_deleted_sessions_are_not_served_from_cache(self, client):
+        from app import database
+        user_id = database.create_user("session_cache_test", "x")
+        try:
+            database.create_session("session-cache-a", user_id)
+            database.create_session("session-cache-b", user_id)
+            assert database.get_session("session-cache-a")["user_id"] == user_id
+            assert database.get_session("session-cache-b")["user_id"] == user_id
+
+            database.delete_session("session-cache-a")
+            assert database.get_session("session-cache-a") is None
+            database.delete_user_sessions(user_id)
+            assert database.get_session("session-cache-b") is None
+        finally:
+            database.delete_user(user_id)
+
+
+class TestShowsCache:
+    def test_library_writes_retire_cached_pages(self, library_items):
+        from app import database
+
+        library_items("shows", "Cache Test Show/Season 1", ["E01.mkv"])
+        shows, total = database.query_shows(q="Cache Test Show")
+        assert total == 1 and shows[0]["episode_count"] == 1
+
+        library_items("shows", "Cache Test Show/Season 1", ["E02.mkv"])
+        shows, total = database.query_shows(q="Cache Test Show")
+        assert shows[0]["episode_count"] == 2
+
+        database.delete_library_index_items_by_prefix("/data/shows/Cache Test Show")
+        assert database.query_shows(q="Cache Test Show") == ([], 0)
+
+
+class TestLibraryCursor:
+    def test_cursor_outlives_its_row(self, library_items):
+        from app import database
+
+        library_items("movies", "Cursor Test", [f"Cursor Test {n}.mkv" for n in (1, 2, 3, 10)])
+        page, _ = database.query_library_index("movies", q="cursor test", limit=2)
+        assert [item["name"] for item in page] == ["Cursor Test 1.mkv", "Cursor Test 2.mkv"]
+
+        cursor = database.library_cursor(page[-1])
+        database.delete_library_index_item(page[-1]["path"])
+        page, _ = database.query_library_index("movies", q="cursor test", limit=2, after=cursor)
+        assert [item["name"] for item in page] == ["Cursor Test 3.mkv", "Cursor Test 10.mkv"]